@@ -1,18 +1,15 @@
+import contextlib
 import functools
 import json
 import jwt
-import os
 import time
 import warnings
 warnings.filterwarnings("ignore")
-from google.auth.transport import requests
-from google.oauth2.id_token import verify_oauth2_token
-import firebase_admin
-from firebase_admin import credentials, firestore
 
 import reflex as rx
 from chatapp.chatbot import chat, action_bar, chatmodel, reset_button
 from chatapp.chatbot import State as ChatState
+from chatapp.state import set_progress_saver
 import chatapp.style as style
 from typing import Dict, Any
 
@@ -20,8 +17,11 @@ from documentation.documentation_help import State as DocumentationState
 from jobs.job_scraper import State as JobState
 from documentation.documentation_components import documents, documents_formarea
 from jobs.jobs_components import jobs
+from .career_planner import State as CareerPlannerState, career_plan
 
 
+from .auth import verify_token
+from .profile_store import load_profile, update_profile, invalidate_profile, flush_profile_writes
 from .react_oauth_google import (
     GoogleOAuthProvider,
     GoogleLogin,
@@ -30,24 +30,20 @@ from .react_oauth_google import (
 CLIENT_ID = "1015718854739-g3f89h7evie5qduse4egv5d9jeddhsol.apps.googleusercontent.com"
 
 
-class State(ChatState):
-    db: int = 0
-
-    def get_db(self):
-        if self.db != 0:
-            return self.db
-        # Initialize Firebase (do this only once, typically at the start of your application)
-        # Get the directory of the current script
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        # Construct the path to the credentials file
-        cred_path = os.path.join(current_dir, "..", "firebase-credentials.json")
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-        self.db = firestore.client()
-        return self.db
+def save_survey_progress(user_id, chat_history, current_question_index):
+    update_profile(user_id, {
+        # Firestore can't store nested arrays, so each (question, answer) pair becomes a map
+        'chat_history': [{'question': question, 'answer': answer} for question, answer in chat_history],
+        'current_question_index': current_question_index,
+    })
+
+
+# The chatbot's handlers run on ChatState, which saves progress through this
+set_progress_saver(save_survey_progress)
+
 
+class State(ChatState):
     id_token_json: str = rx.LocalStorage()
-    user_id: str = ""
     old_user: bool = False
 
     def on_success(self, id_token: dict):
@@ -65,13 +61,8 @@ class State(ChatState):
     @rx.var(cache=True)
     def tokeninfo(self) -> dict[str, str]:
         try:
-            token_info = verify_oauth2_token(
-                json.loads(self.id_token_json)[
-                    "credential"
-                ],
-                requests.Request(),
-                CLIENT_ID,
-            )
+            # Served from the process-wide verified-token and cert caches after the first check
+            token_info = verify_token(json.loads(self.id_token_json)["credential"], CLIENT_ID)
             self.user_id = token_info.get('sub')
             return token_info
         except Exception as exc:
@@ -110,7 +101,8 @@ class State(ChatState):
             'skills': self.skills,
             'education': self.education,
         }
-        self.get_db().collection('users').document(self.user_id).set(user_data)
+        # Queued and written to Firestore in the background
+        update_profile(self.user_id, user_data)
         self.old_user = True
         ChatState.current_question_index = 0
         return rx.redirect('/chatbot')
@@ -123,19 +115,27 @@ class State(ChatState):
         self.education = ''
         ChatState.current_question_index = 0
         ChatState.chat_history = []
+        invalidate_profile(self.user_id)
 
     def load_user_profile(self):
         user_id = self.tokeninfo.get('sub')
-        doc_ref = self.get_db().collection('users').document(user_id)
-        doc = doc_ref.get()
-        if doc.exists:
-            user_data = doc.to_dict()
+        if not user_id:
+            return
+        # Served from the in-memory profile cache after the first page load
+        user_data = load_profile(user_id)
+        if user_data is not None:
             self.location = user_data.get('location', '')
             self.immigration_status = user_data.get('immigration_status', '')
             self.when_moved = user_data.get('when_moved', '')
             self.skills = user_data.get('skills', [])
             self.education = user_data.get('education', '')
-            self.old_user = True
+            # Survey progress alone is saved before the profile is finished
+            self.old_user = 'immigration_status' in user_data
+            # Resume a survey from another session, but don't clobber one in progress here
+            saved_history = user_data.get('chat_history')
+            if saved_history and self.current_question_index == 0 and len(self.chat_history) <= 2:
+                self.chat_history = [(entry.get('question', ''), entry.get('answer', '')) for entry in saved_history]
+                self.current_question_index = user_data.get('current_question_index', 0)
     
     def redirect_to_chatbot(self):
         return rx.redirect('/chatbot')
@@ -455,7 +455,19 @@ def career_planner() -> rx.Component:
     return rx.box(
         NavBar(),
         rx.center(
-            rx.image(src="/career_plan_graph.png", height = "auto")
+            rx.cond(
+                State.old_user,
+                rx.container(
+                    career_plan(),
+                    on_mount=CareerPlannerState.get_career_plan(State.user_id, State.skills, State.education, State.immigration_status, State.location),
+                ),
+                rx.container(
+                    rx.text("Please complete your profile to view your career plan."),
+                    rx.button("Complete Profile", on_click=State.redirect_to_chatbot),
+                ),
+            ),
+            padding="20px",
+            width="100%",
         ),
         width="100%",
         spacing="20px",
@@ -498,6 +510,15 @@ app = rx.App(
     )
 )
 
+@contextlib.asynccontextmanager
+async def profile_writes_lifespan():
+    yield
+    # Write any queued profile updates before the server exits
+    await flush_profile_writes()
+
+
+app.register_lifespan_task(profile_writes_lifespan)
+
 app.add_page(index)
 app.add_page(protected)
 app.add_page(chatbot)
@@ -1,80 +1,297 @@
 import os
 import json
+import hashlib
 import networkx as nx
-import matplotlib.pyplot as plt
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
+from common import llm_gateway
+from common.json_utils import JSONArrayStream, JSONParseError, parse_json, validate
+from common.skills import canonical_skill_ids
 
 load_dotenv()
 
+# Client-side layout, in pixels: React Flow's default node size plus the gaps between them
+NODE_WIDTH = 150
+NODE_HEIGHT = 40
+COLUMN_GAP = 60
+ROW_GAP = 20
+
+NAMED_ITEMS_SCHEMA = {
+    "type": "array",
+    "items": {"type": "object", "properties": {"name": {"type": "string"}}, "required": ["name"]},
+}
+
+YEAR_SCHEMA = {
+    "type": "object",
+    "properties": {"year": {"type": "integer"}, "courses": NAMED_ITEMS_SCHEMA, "jobs": NAMED_ITEMS_SCHEMA},
+    "required": ["year"],
+}
+
+CAREER_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {"years": {"type": "array", "items": YEAR_SCHEMA}},
+    "required": ["years"],
+}
+
+# Profile fields a plan depends on, and which part of the plan each one affects:
+# (kinds of plan items to regenerate, number of leading years affected or None for all)
+PLAN_FIELD_SCOPES = {
+    "skills": (("courses",), None),
+    "education": (("courses", "jobs"), None),
+    "immigration_status": (("jobs",), None),
+    # Later years don't depend on where the user lives today
+    "location": (("jobs",), 2),
+}
+PLAN_ITEM_KINDS = ("courses", "jobs")
+NODE_KINDS = {"courses": "course", "jobs": "job"}
+
+
+def _field_version(field, value):
+    if field == "skills":
+        # Canonical ids, so rewording or reordering skills isn't a change
+        value = canonical_skill_ids(value or [])
+    elif isinstance(value, str):
+        value = " ".join(value.lower().split())
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def profile_versions(user_profile):
+    """Hash of every profile field the plan depends on."""
+    return {field: _field_version(field, user_profile.get(field)) for field in PLAN_FIELD_SCOPES}
+
+
+def plan_changes(old_versions, new_versions, plan_years):
+    """Which plan items a profile change invalidates, as {kind: [years]}; None means rebuild the whole plan."""
+    if not old_versions or set(old_versions) != set(new_versions):
+        return None
+    changes = {}
+    for field, (kinds, leading_years) in PLAN_FIELD_SCOPES.items():
+        if old_versions[field] == new_versions[field]:
+            continue
+        years = plan_years if leading_years is None else plan_years[:leading_years]
+        for kind in kinds:
+            changes.setdefault(kind, set()).update(years)
+    if all(set(changes.get(kind, ())) == set(plan_years) for kind in PLAN_ITEM_KINDS):
+        return None
+    return {kind: sorted(years) for kind, years in changes.items()}
+
+
 class CareerPlanGraph:
-    def __init__(self, user_profile):
+    def __init__(self, user_profile, plan=None):
         self.user_profile = user_profile
         self.graph = nx.DiGraph()
-        self.client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
+        self.plan = {"years": []}
+        if plan:
+            self.load_plan(plan)
+
+    def plan_messages(self):
+        return [
+            {"role": "system", "content": "You are a career guidance expert. Given the user's skills, education, desired career, and immigration status, provide a list of potential career paths, courses, and job opportunities for the next 1-5 years. The response should be a JSON object in the following format: {\"years\": [{\"year\": <year_number>, \"courses\": [{\"name\": <course_name>}], \"jobs\": [{\"name\": <job_name>}]}]}."},
+            {"role": "user", "content": json.dumps(self.user_profile)}
+        ]
 
     async def generate_career_paths(self):
         """Use OpenAI to generate personalized career paths based on the user profile."""
-        response = await self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a career guidance expert. Given the user's skills, education, desired career, and immigration status, provide a list of potential career paths, courses, and job opportunities for the next 1-5 years. The response should be in the following JSON format: {'years': [{'year': <year_number>, 'courses': [{'name': <course_name>}], 'jobs': [{'name': <job_name>}]}]}."},
-                {"role": "user", "content": json.dumps(self.user_profile)}
-            ],
+        response = await llm_gateway.chat_completion(
+            model="gpt-4-turbo",
+            messages=self.plan_messages(),
+            response_format={"type": "json_object"},
             temperature=1.0
         )
         return response.choices[0].message.content
 
+    async def stream_career_paths(self):
+        """Streaming generate_career_paths: yields the completion text chunk by chunk."""
+        stream = await llm_gateway.chat_completion(
+            model="gpt-4-turbo",
+            messages=self.plan_messages(),
+            response_format={"type": "json_object"},
+            temperature=1.0,
+            stream=True,
+        )
+        async for item in stream:
+            if item.choices and item.choices[0].delta.content:
+                yield item.choices[0].delta.content
+
+    def add_item(self, year_label, year_number, kind, item):
+        # The kind is part of the id so a course and a job with the same name stay separate nodes
+        item_node = f"{year_label}: {NODE_KINDS[kind]}: {item['name']}"
+        self.graph.add_node(item_node, layer=year_number, kind=NODE_KINDS[kind], label=item['name'])
+        self.graph.add_edge(year_label, item_node)
+
+    def add_year(self, year):
+        """Add one year of the plan to the graph; nodes carry the kind of item they are and a display label."""
+        year_label = f"Year {year['year']}"
+        self.graph.add_node(year_label, layer=year['year'], kind="year", label=year_label)
+
+        for kind in PLAN_ITEM_KINDS:
+            for item in year.get(kind, []):
+                self.add_item(year_label, year['year'], kind, item)
+
+    def load_plan(self, plan):
+        self.plan = plan
+        for year in plan.get("years", []):
+            self.add_year(year)
+
     async def parse_generated_plan(self, generated_plan):
         """Parse the AI-generated plan and add nodes to the graph accordingly."""
         try:
-            plan = json.loads(generated_plan)
-            for year in plan.get("years", []):
-                year_label = f"Year {year['year']}"
-                self.graph.add_node(year_label, layer=year['year'])
-
-                for course in year.get("courses", []):
-                    course_node = f"{year_label}: {course['name']}"
-                    self.graph.add_node(course_node, layer=year['year'])
-                    self.graph.add_edge(year_label, course_node)
-
-                for job in year.get("jobs", []):
-                    job_node = f"{year_label}: {job['name']}"
-                    self.graph.add_node(job_node, layer=year['year'])
-                    self.graph.add_edge(year_label, job_node)
-
-        except json.JSONDecodeError:
-            print("Error: Unable to parse the generated plan. The response was not a valid JSON.")
+            self.load_plan(parse_json(generated_plan, CAREER_PLAN_SCHEMA))
+        except JSONParseError as exc:
+            print(f"Error: Unable to parse the generated plan: {exc}")
             print("Generated Response:", generated_plan)
 
-    async def generate_career_plan(self):
-        """Generate and create the career graph based on user profile and OpenAI suggestions."""
-        generated_plan = await self.generate_career_paths()
-        await self.parse_generated_plan(generated_plan)
+    async def generate_career_plan(self, on_year=None):
+        """Generate and create the career graph, adding each year as soon as it has streamed in.
 
-    def draw_graph(self):
-        """Visualize the generated career plan graph and save it as a PNG file."""
-        pos = nx.multipartite_layout(self.graph, subset_key="layer")
+        on_year(year) is awaited after each year is added, so callers can show the plan as it grows.
+        """
+        years = JSONArrayStream("years")
+        generated_plan = ""
+        async for chunk in self.stream_career_paths():
+            generated_plan += chunk
+            for year in years.feed(chunk):
+                try:
+                    year = validate(year, YEAR_SCHEMA)
+                except JSONParseError as exc:
+                    print(f"Skipping malformed plan year: {exc}")
+                    continue
+                self.plan["years"].append(year)
+                self.add_year(year)
+                if on_year:
+                    await on_year(year)
+
+        if not self.plan["years"]:
+            # No complete year came through the stream; fall back to repairing the whole reply
+            await self.parse_generated_plan(generated_plan)
 
-        # Set up plot
-        plt.figure(figsize=(15, 10))
-        nx.draw(self.graph, pos, with_labels=True, node_color="skyblue", node_size=3000, font_size=10, font_color="black", edge_color="gray")
-        plt.title("Career Path Graph by Year", fontsize=16)
+    def plan_years(self):
+        return [year['year'] for year in self.plan.get("years", [])]
 
+    async def generate_plan_patch(self, changes):
+        """Ask for new items only for the kinds and years in changes, keeping the rest of the plan as context."""
+        wanted = "; ".join(f"{kind} for years {', '.join(map(str, years))}" for kind, years in changes.items())
+        response = await llm_gateway.chat_completion(
+            model="gpt-4-turbo",
+            messages=[
+                {"role": "system", "content": "You are a career guidance expert updating an existing career plan after the user's profile changed. Here is the current plan: " + json.dumps(self.plan) + f". Regenerate only the following, consistent with the rest of the plan and the updated profile: {wanted}. The response should be a JSON object in the following format, containing only those years and lists: {{\"years\": [{{\"year\": <year_number>, \"courses\": [{{\"name\": <course_name>}}], \"jobs\": [{{\"name\": <job_name>}}]}}]}}."},
+                {"role": "user", "content": json.dumps(self.user_profile)}
+            ],
+            response_format={"type": "json_object"},
+            temperature=1.0
+        )
+        return response.choices[0].message.content
+
+    def patch_plan(self, patch, changes):
+        """Replace the changed items of each affected year, in the plan and in the graph.
+
+        Returns False, leaving the plan untouched, if the patch is missing any changed (kind, year).
+        """
+        years = {year['year']: year for year in self.plan.get("years", [])}
+        new_years = {new_year['year']: new_year for new_year in patch.get("years", [])}
+        for kind, kind_years in changes.items():
+            missing = [year for year in kind_years if year in years and kind not in new_years.get(year, {})]
+            if missing:
+                print(f"Plan update is missing {kind} for years {missing}")
+                return False
+
+        for year_number, year in years.items():
+            year_label = f"Year {year_number}"
+            for kind, kind_years in changes.items():
+                if year_number not in kind_years:
+                    continue
+                stale_nodes = [
+                    node for node in self.graph.successors(year_label)
+                    if self.graph.nodes[node].get("kind") == NODE_KINDS[kind]
+                ]
+                self.graph.remove_nodes_from(stale_nodes)
+                year[kind] = new_years[year_number][kind]
+                for item in year[kind]:
+                    self.add_item(year_label, year_number, kind, item)
+        return True
+
+    async def update_career_plan(self, changes):
+        """Regenerate only the parts of an existing plan a profile change affects. Returns whether it was patched."""
+        generated_patch = await self.generate_plan_patch(changes)
+        try:
+            return self.patch_plan(parse_json(generated_patch, CAREER_PLAN_SCHEMA), changes)
+        except JSONParseError as exc:
+            print(f"Error: Unable to parse the plan update: {exc}")
+            return False
+
+    def draw_graph(self):
+        """Visualize the generated career plan graph and save it as a PNG file."""
         # Define the path for assets folder located outside of the current directory
         assets_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets")
-        
-        # Check if assets directory exists, create it if it doesn't
-        if not os.path.exists(assets_dir):
-            os.makedirs(assets_dir)
-
-        # Save the figure as a PNG file in the assets directory
         graph_file_path = os.path.join(assets_dir, "career_plan_graph.png")
-        plt.savefig(graph_file_path)
+        render_graph_png(graph_payload(self.graph), graph_file_path)
         print(f"Career path graph saved to {graph_file_path}")
 
-        # Clear the plot after saving to avoid overlapping on the next plot
-        plt.clf()
+
+def graph_payload(graph):
+    """Canonical, JSON-serializable form of a plan graph: sorted [name, layer, label] nodes and [source, target] edges."""
+    nodes = sorted([name, data.get("layer", 0), data.get("label", name)] for name, data in graph.nodes(data=True))
+    edges = sorted([source, target] for source, target in graph.edges())
+    return {"nodes": nodes, "edges": edges}
+
+
+def graph_layout(graph):
+    """Compact node/edge payload with precomputed positions, for drawing the plan in the browser."""
+    if not graph.number_of_nodes():
+        return {"nodes": [], "edges": []}
+    # One column per year, year node on top and its items below in plan order,
+    # spaced by node size so nodes never overlap
+    layers = sorted({layer for _, layer in graph.nodes(data="layer")})
+    columns = {layer: column for column, layer in enumerate(layers)}
+    positions = {}
+    rows = dict.fromkeys(layers, 0)
+    for name, layer in sorted(graph.nodes(data="layer"), key=lambda node: graph.in_degree(node[0]) > 0):
+        positions[name] = {"x": columns[layer] * (NODE_WIDTH + COLUMN_GAP), "y": rows[layer] * (NODE_HEIGHT + ROW_GAP)}
+        rows[layer] += 1
+    nodes = [
+        {
+            "id": name,
+            # Node ids are prefixed with their year and kind to keep them unique; show just the name
+            "data": {"label": graph.nodes[name].get("label", name)},
+            "position": position,
+            **({"type": "input"} if graph.in_degree(name) == 0 else {}),
+        }
+        for name, position in sorted(positions.items())
+    ]
+    edges = [
+        {"id": f"e{i}", "source": source, "target": target}
+        for i, (source, target) in enumerate(sorted(graph.edges()))
+    ]
+    return {"nodes": nodes, "edges": edges}
+
+
+def render_graph_png(payload, path):
+    """Draw a graph_payload to a PNG at path. Runs in a worker process, so it only takes plain data."""
+    # matplotlib is slow to import and only needed for PNG renders
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    graph = nx.DiGraph()
+    for name, layer, label in payload["nodes"]:
+        graph.add_node(name, layer=layer, label=label)
+    graph.add_edges_from(payload["edges"])
+    pos = nx.multipartite_layout(graph, subset_key="layer")
+    labels = {name: label for name, label in graph.nodes(data="label")}
+
+    # Set up plot
+    figure = plt.figure(figsize=(15, 10))
+    nx.draw(graph, pos, labels=labels, with_labels=True, node_color="skyblue", node_size=3000, font_size=10, font_color="black", edge_color="gray")
+    plt.title("Career Path Graph by Year", fontsize=16)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write to a temporary file first so readers never see a half-written image
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    figure.savefig(tmp_path, format="png")
+    os.replace(tmp_path, path)
+
+    # Close the figure after saving to avoid overlapping on the next plot
+    plt.close(figure)
+
 
 # Testing with a sample user profile
 if __name__ == "__main__":
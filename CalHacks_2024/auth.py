@@ -0,0 +1,122 @@
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from google.auth.transport import requests
+from google.oauth2.id_token import verify_oauth2_token
+
+# Used when Google's response has no Cache-Control max-age (it normally sends ~6 hours)
+DEFAULT_CERT_MAX_AGE = 300
+MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+# Verified ID tokens kept in memory, keyed by token hash
+MAX_VERIFIED_TOKENS = 2048
+
+
+class CachingCertRequest:
+    """google.auth transport request that caches GET responses for their Cache-Control max-age.
+
+    verify_oauth2_token fetches Google's signing certs through the request it is
+    given on every call; with this one the certs are fetched once per max-age
+    for the whole process, over one pooled session.
+    """
+
+    def __init__(self, request=None):
+        self.request = request or requests.Request()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        if method != "GET":
+            return self.request(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+
+        with self._lock:
+            cached = self._cache.get(url)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        response = self.request(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+        if response.status == 200:
+            cache_control = {key.lower(): value for key, value in (response.headers or {}).items()}.get("cache-control", "")
+            match = MAX_AGE_RE.search(cache_control)
+            max_age = int(match.group(1)) if match else DEFAULT_CERT_MAX_AGE
+            with self._lock:
+                self._cache[url] = (response, time.monotonic() + max_age)
+        return response
+
+
+class StaticCertsRequest:
+    """Serves a fixed set of certs (e.g. generated in a test) instead of Google's, counting fetches."""
+
+    def __init__(self, certs, max_age=3600):
+        self.certs = certs
+        self.max_age = max_age
+        self.fetches = 0
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        self.fetches += 1
+        return SimpleNamespace(
+            status=200,
+            headers={"Cache-Control": f"public, max-age={self.max_age}"},
+            data=json.dumps(self.certs).encode("utf-8"),
+        )
+
+
+class VerifiedTokenCache:
+    """Claims of already-verified ID tokens, served until the token's exp.
+
+    Entries are keyed by token and client id, since a token is only verified for one audience.
+    """
+
+    def __init__(self, max_size=MAX_VERIFIED_TOKENS):
+        self.max_size = max_size
+        self._claims = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token, client_id):
+        return hashlib.sha256(f"{client_id}\n{token}".encode("utf-8")).hexdigest()
+
+    def get(self, token, client_id):
+        key = self.key(token, client_id)
+        with self._lock:
+            claims = self._claims.get(key)
+            if claims is None:
+                return None
+            if int(claims.get("exp", 0)) <= time.time():
+                del self._claims[key]
+                return None
+            self._claims.move_to_end(key)
+            return claims
+
+    def set(self, token, client_id, claims):
+        key = self.key(token, client_id)
+        with self._lock:
+            self._claims[key] = claims
+            self._claims.move_to_end(key)
+            while len(self._claims) > self.max_size:
+                self._claims.popitem(last=False)
+
+
+cert_request = CachingCertRequest()
+verified_tokens = VerifiedTokenCache()
+
+
+def set_cert_request(request):
+    """Swap the cert source, e.g. set_cert_request(CachingCertRequest(StaticCertsRequest(certs))) in tests."""
+    global cert_request
+    cert_request = request
+
+
+def verify_token(token, client_id):
+    """Verify a Google ID token, returning its claims. Raises ValueError if it is invalid."""
+    claims = verified_tokens.get(token, client_id)
+    if claims is not None:
+        return claims
+    claims = verify_oauth2_token(token, cert_request, client_id)
+    verified_tokens.set(token, client_id, claims)
+    return claims
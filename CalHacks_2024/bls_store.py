@@ -0,0 +1,184 @@
+import os
+import re
+import csv
+import sys
+import json
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+# Local store of BLS occupational employment series, built offline with
+#   python -m CalHacks_2024.bls_store <bls export>.csv
+# The CSV needs an occupation title column, an SOC code column and one
+# employment column per year (any header containing the year, e.g. the
+# "Employment, 2023" / "Employment, 2033" columns of the Employment
+# Projections tables). Employment is stored as an occupations x years float32
+# matrix that is memory-mapped at query time, so growth for every candidate
+# career is computed in one vectorized pass with no network calls.
+
+BLS_STORE_DIR = os.environ.get("BLS_STORE_DIR", os.path.join(".cache", "bls"))
+EMPLOYMENT_FILE = "employment.npy"
+INDEX_FILE = "index.json"
+
+# Share of a career title's words that must appear in an occupation title for it to match
+TITLE_MATCH_THRESHOLD = 0.6
+
+YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+SOC_CODE_RE = re.compile(r"^\d{2}-\d{4}$")
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+TITLE_STOPWORDS = {"and", "or", "of", "the", "all", "other", "a", "an", "in"}
+
+
+def normalize_title(title):
+    return " ".join(TOKEN_RE.findall(title.lower()))
+
+
+def title_tokens(title):
+    tokens = {token for token in TOKEN_RE.findall(title.lower()) if token not in TITLE_STOPWORDS}
+    # Crude singularization so "nurses" matches "nurse"
+    return {token[:-1] if len(token) > 3 and token.endswith("s") else token for token in tokens}
+
+
+def _parse_number(value):
+    try:
+        return float(value.replace(",", "").strip())
+    except (AttributeError, ValueError):
+        return np.nan
+
+
+def _find_columns(header):
+    lowered = [column.lower() for column in header]
+    title_column = next(i for i, column in enumerate(lowered) if "title" in column)
+    code_column = next(i for i, column in enumerate(lowered) if "code" in column or "soc" in column)
+    year_columns = {}
+    for i, column in enumerate(header):
+        match = YEAR_RE.search(column)
+        if match and i not in (title_column, code_column):
+            year_columns.setdefault(int(match.group(0)), i)
+    if len(year_columns) < 2:
+        raise ValueError("Need employment columns for at least two years.")
+    return title_column, code_column, dict(sorted(year_columns.items()))
+
+
+def ingest(csv_path, store_dir=BLS_STORE_DIR):
+    """Build the store from a BLS CSV export. Returns the number of occupations stored."""
+    with open(csv_path, newline="", encoding="utf-8-sig") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        title_column, code_column, year_columns = _find_columns(header)
+
+        titles, soc_codes, rows = [], [], []
+        for row in reader:
+            if len(row) <= max(title_column, code_column, *year_columns.values()):
+                continue
+            soc_code = row[code_column].strip()
+            # Skip summary rows ("00-0000 Total, all occupations") and footnotes
+            if not SOC_CODE_RE.match(soc_code) or soc_code.endswith("0000"):
+                continue
+            titles.append(row[title_column].strip())
+            soc_codes.append(soc_code)
+            rows.append([_parse_number(row[i]) for i in year_columns.values()])
+
+    os.makedirs(store_dir, exist_ok=True)
+    np.save(os.path.join(store_dir, EMPLOYMENT_FILE), np.asarray(rows, dtype=np.float32).reshape(len(rows), len(year_columns)))
+    with open(os.path.join(store_dir, INDEX_FILE), "w", encoding="utf-8") as file:
+        json.dump({"years": list(year_columns), "soc_codes": soc_codes, "titles": titles}, file)
+    print(f"Stored {len(titles)} occupations for {list(year_columns)} in {store_dir}")
+    return len(titles)
+
+
+class BLSStore:
+    def __init__(self, store_dir=BLS_STORE_DIR):
+        with open(os.path.join(store_dir, INDEX_FILE), encoding="utf-8") as file:
+            index = json.load(file)
+        self.years = np.asarray(index["years"])
+        self.soc_codes = index["soc_codes"]
+        self.titles = index["titles"]
+        self.employment = np.load(os.path.join(store_dir, EMPLOYMENT_FILE), mmap_mode="r")
+
+        self.by_soc_code = {soc_code: row for row, soc_code in enumerate(self.soc_codes)}
+        self.by_title = {normalize_title(title): row for row, title in enumerate(self.titles)}
+        self.row_tokens = [title_tokens(title) for title in self.titles]
+        self.token_rows = defaultdict(set)
+        for row, tokens in enumerate(self.row_tokens):
+            for token in tokens:
+                self.token_rows[token].add(row)
+
+        # Growth for every occupation up front: first to last year with data
+        first, last = self.employment[:, 0].astype(np.float64), self.employment[:, -1].astype(np.float64)
+        span = float(self.years[-1] - self.years[0])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.percent_change = np.where(first > 0, (last / first - 1) * 100, np.nan)
+            self.annual_growth = np.where(first > 0, ((last / first) ** (1 / span) - 1) * 100, np.nan)
+
+    def find(self, career):
+        """Row of the occupation matching a career title or SOC code, or None."""
+        career = career.strip()
+        if career in self.by_soc_code:
+            return self.by_soc_code[career]
+        row = self.by_title.get(normalize_title(career))
+        if row is not None:
+            return row
+
+        tokens = title_tokens(career)
+        candidates = set().union(*(self.token_rows.get(token, set()) for token in tokens)) if tokens else set()
+        best, best_score = None, (0, 0)
+        for row in candidates:
+            overlap = len(tokens & self.row_tokens[row])
+            # Coverage of the career's words first, then the tightest occupation title
+            score = (overlap / len(tokens), overlap / len(tokens | self.row_tokens[row]))
+            if score > best_score:
+                best, best_score = row, score
+        return best if best_score[0] >= TITLE_MATCH_THRESHOLD else None
+
+    def growth(self, careers):
+        """Growth data for many careers at once, as {career: dict}; careers with no occupation are left out."""
+        matched = {career: row for career in careers if (row := self.find(career)) is not None}
+        if not matched:
+            return {}
+        rows = np.fromiter(matched.values(), dtype=np.int64)
+        employment = np.asarray(self.employment[rows])
+        percent_change = self.percent_change[rows]
+        annual_growth = self.annual_growth[rows]
+        return {
+            career: {
+                "soc_code": self.soc_codes[row],
+                "occupation": self.titles[row],
+                "years": self.years.tolist(),
+                "employment": [None if np.isnan(value) else round(float(value), 1) for value in employment[i]],
+                "percent_change": None if np.isnan(percent_change[i]) else round(float(percent_change[i]), 1),
+                "annual_growth": None if np.isnan(annual_growth[i]) else round(float(annual_growth[i]), 2),
+            }
+            for i, (career, row) in enumerate(matched.items())
+        }
+
+    def rank_by_growth(self, careers):
+        """careers sorted by projected growth, fastest first; careers with no data go last in their original order."""
+        if not careers:
+            return []
+        rows = np.array([-1 if (row := self.find(career)) is None else row for career in careers], dtype=np.int64)
+        growth = np.where(rows >= 0, self.percent_change[np.maximum(rows, 0)], np.nan)
+        order = np.argsort(-np.nan_to_num(growth, nan=-np.inf), kind="stable")
+        return [careers[i] for i in order]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide store, or None if it hasn't been built."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = BLSStore()
+            except FileNotFoundError:
+                print(f"BLS store not found in {BLS_STORE_DIR}; run python -m CalHacks_2024.bls_store <csv>")
+                _store = False
+    return _store or None
+
+
+if __name__ == "__main__":
+    ingest(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else BLS_STORE_DIR)
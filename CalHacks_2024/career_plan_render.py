@@ -0,0 +1,88 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import reflex as rx
+
+from CalHacks_2024.CareerPlanGraph import graph_payload, render_graph_png
+
+# Rendered plans live in the upload dir, named by a hash of the plan graph
+RENDER_SUBDIR = "career_plans"
+RENDER_WORKERS = int(os.environ.get("CAREER_PLAN_RENDER_WORKERS", 2))
+# Least recently used renders are evicted past either limit
+MAX_RENDERS = int(os.environ.get("CAREER_PLAN_MAX_RENDERS", 500))
+MAX_RENDER_BYTES = int(os.environ.get("CAREER_PLAN_MAX_RENDER_BYTES", 200 * 1024 * 1024))
+
+_executor = None
+_executor_lock = threading.Lock()
+_inflight = {}
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return _executor
+
+
+def plan_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+
+def render_dir():
+    directory = os.path.join(rx.get_upload_dir(), RENDER_SUBDIR)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def evict_renders(directory, keep=None):
+    """Delete the least recently used renders until both the count and size limits are met."""
+    renders = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(".png"):
+            stat = entry.stat()
+            renders.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+    renders.sort()
+    count = len(renders)
+    total_bytes = sum(size for _, size, _, _ in renders)
+    for _, size, path, name in renders:
+        if count <= MAX_RENDERS and total_bytes <= MAX_RENDER_BYTES:
+            break
+        if name == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        count -= 1
+        total_bytes -= size
+
+
+async def render_plan(graph):
+    """Render a plan graph in the process pool and return its file name in the upload dir.
+
+    Identical plans map to the same file and are only rendered once.
+    """
+    payload = graph_payload(graph)
+    filename = f"{plan_hash(payload)}.png"
+    directory = render_dir()
+    path = os.path.join(directory, filename)
+
+    if os.path.exists(path):
+        # Reuse counts as a use for LRU eviction
+        os.utime(path)
+        return filename
+
+    future = _inflight.get(filename)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = _inflight[filename] = loop.run_in_executor(_get_executor(), render_graph_png, payload, path)
+        future.add_done_callback(lambda _: _inflight.pop(filename, None))
+    await asyncio.shield(future)
+
+    await asyncio.to_thread(evict_renders, directory, filename)
+    return filename
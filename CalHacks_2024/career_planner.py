@@ -0,0 +1,149 @@
+import os
+import json
+import hashlib
+import reflex as rx
+from typing import Any
+
+from common.cache import PersistentCache
+from CalHacks_2024.CareerPlanGraph import CareerPlanGraph, graph_layout, profile_versions, plan_changes
+from CalHacks_2024.career_plan_render import RENDER_SUBDIR, render_plan
+from CalHacks_2024.react_flow import ReactFlow, Background, Controls
+
+# "graph" draws the plan in the browser from a small JSON payload; "png" renders an image on the server
+CAREER_PLAN_RENDERER = os.environ.get("CAREER_PLAN_RENDERER", "graph").lower()
+
+# Each user's latest plan with the versions of the profile fields it was built from
+plan_store = PersistentCache("career_plans", ttl=180 * 24 * 3600)
+
+
+def profile_key(user_profile):
+    return hashlib.sha256(json.dumps(user_profile, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+async def build_career_plan(user_id, user_profile, on_year=None):
+    """The user's plan for this profile, reusing their stored plan and regenerating only what the profile change affects."""
+    versions = profile_versions(user_profile)
+    stored = plan_store.get(user_id) if user_id else None
+    if stored is not None:
+        stored = stored[0]
+        career_plan_graph = CareerPlanGraph(user_profile, plan=stored["plan"])
+        changes = plan_changes(stored["versions"], versions, career_plan_graph.plan_years())
+        if changes == {}:
+            return career_plan_graph
+        # Versions are only saved once every changed section has been regenerated;
+        # an incomplete patch falls through to a full rebuild
+        if changes and await career_plan_graph.update_career_plan(changes):
+            plan_store.set(user_id, {"plan": career_plan_graph.plan, "versions": versions})
+            return career_plan_graph
+
+    career_plan_graph = CareerPlanGraph(user_profile)
+
+    async def report_year(year):
+        if on_year:
+            await on_year(career_plan_graph, year)
+
+    await career_plan_graph.generate_career_plan(on_year=report_year)
+    if user_id and career_plan_graph.plan["years"]:
+        plan_store.set(user_id, {"plan": career_plan_graph.plan, "versions": versions})
+    return career_plan_graph
+
+
+class State(rx.State):
+    plan_renderer: str = CAREER_PLAN_RENDERER
+    plan_nodes: list[dict[str, Any]] = []
+    plan_edges: list[dict[str, Any]] = []
+    # File name under the upload dir; the image src is built in the component
+    plan_image_name: str = ""
+    plan_status: str = ""
+    plan_profile_key: str = ""
+    plan_running: bool = False
+
+    @rx.background
+    async def get_career_plan(self, user_id, skills, education, immigration_status, location):
+        user_profile = {
+            "skills": skills,
+            "education": education,
+            "immigration_status": immigration_status,
+            "location": location,
+            "years_in_plan": 5,
+        }
+        key = profile_key(user_profile)
+        async with self:
+            # Keep this session's plan until the profile changes
+            if self.plan_running or self.plan_profile_key == key:
+                return
+            self.plan_running = True
+            self.plan_status = "Building your career plan..."
+
+        try:
+            async def show_partial_plan(partial_graph, year):
+                # Show each year as soon as it has streamed in
+                layout = graph_layout(partial_graph.graph) if CAREER_PLAN_RENDERER != "png" else None
+                async with self:
+                    if layout:
+                        self.plan_nodes = layout["nodes"]
+                        self.plan_edges = layout["edges"]
+                    self.plan_status = f"Building your career plan... (year {year['year']} ready)"
+
+            career_plan_graph = await build_career_plan(user_id, user_profile, on_year=show_partial_plan)
+            if not career_plan_graph.graph.number_of_nodes():
+                async with self:
+                    self.plan_status = "We couldn't build a career plan right now. Please try again later."
+                return
+            if CAREER_PLAN_RENDERER == "png":
+                # Rendered in a worker process into a per-plan file, so sessions never share an image
+                filename = await render_plan(career_plan_graph.graph)
+                async with self:
+                    self.plan_image_name = filename
+            else:
+                layout = graph_layout(career_plan_graph.graph)
+                async with self:
+                    self.plan_nodes = layout["nodes"]
+                    self.plan_edges = layout["edges"]
+            async with self:
+                self.plan_profile_key = key
+                self.plan_status = ""
+        except Exception as exc:
+            print(f"Error building career plan: {exc}")
+            async with self:
+                self.plan_status = "We couldn't build a career plan right now. Please try again later."
+        finally:
+            async with self:
+                self.plan_running = False
+
+
+def career_plan() -> rx.Component:
+    return rx.vstack(
+        rx.cond(
+            State.plan_status != "",
+            rx.text(State.plan_status),
+        ),
+        rx.cond(
+            State.plan_renderer == "png",
+            rx.cond(
+                State.plan_image_name != "",
+                rx.image(
+                    src=rx.get_upload_url(f"{RENDER_SUBDIR}/") + State.plan_image_name,
+                    height="auto",
+                    width="100%",
+                ),
+            ),
+            rx.cond(
+                State.plan_nodes.length() > 0,
+                rx.box(
+                    ReactFlow.create(
+                        Background.create(),
+                        Controls.create(),
+                        nodes=State.plan_nodes,
+                        edges=State.plan_edges,
+                        fit_view=True,
+                        nodes_connectable=False,
+                    ),
+                    height="75vh",
+                    width="100%",
+                ),
+            ),
+        ),
+        align="center",
+        width="100%",
+    )
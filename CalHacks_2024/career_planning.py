@@ -1,16 +1,39 @@
-import google.generativeai as genai
 import os
-import career_resources
+import json
+import asyncio
+from CalHacks_2024 import career_resources, career_scoring
+from common import llm_gateway
+from common.cache import PersistentCache
+from common.json_utils import parse_json
 from dotenv import load_dotenv
-import re
 import random
 import requests
 
 # Loading the environment variables
 load_dotenv()
 
-# Configuring the Gemini API
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+STRING_LIST_SCHEMA = {"type": "array", "items": {"type": "string"}}
+
+# Bounds on the per-career fan-out in agenerate_career_growth_plan
+FANOUT_CONCURRENCY = int(os.environ.get("CAREER_PLAN_CONCURRENCY", 8))
+CALL_TIMEOUT = float(os.environ.get("CAREER_PLAN_CALL_TIMEOUT", 20))
+# The batched required-skills call returns far more tokens than a single lookup
+BATCH_TIMEOUT = float(os.environ.get("CAREER_PLAN_BATCH_TIMEOUT", 90))
+COURSES_PER_SKILL = 5
+
+CAREER_SKILLS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"career": {"type": "string"}, "skills": STRING_LIST_SCHEMA},
+        "required": ["career", "skills"],
+    },
+}
+# Careers per required-skills call; bigger lists are split into several calls
+SKILLS_BATCH_SIZE = 20
+career_skills_cache = PersistentCache("career_skills", ttl=30 * 24 * 3600)
+# Skills lookups that outlived their caller's timeout, kept running so their result is still cached
+_pending_skills_lookups = set()
 
 # Dummy user data for testing purposes
 user_profiles = {
@@ -40,106 +63,230 @@ def recommend_career_path(user_data):
         "top_p": 0.95,
         "top_k": 40,
         "max_output_tokens": 8192,
-        "response_mime_type": "text/plain",
+        "response_mime_type": "application/json",
+        "response_schema": STRING_LIST_SCHEMA,
     }
 
-    model = genai.GenerativeModel(
-        model_name="gemini-1.5-flash-002",
-        generation_config=generation_config,
-    )
-
     prompt = (
         f"Given the user's skills: {skills}, education: {education}, desired industry: "
         f"{desired_industry}, immigration status: {immigration_status}, and career goals: {career_goals}, "
-        f"please suggest potential career paths. Provide as many possible career options as are reasonable."
+        f"please suggest potential career paths. Provide as many possible career options as are reasonable. "
+        f"Respond with a JSON array of career path titles."
     )
-    response = model.generate_content(prompt)
-
-    # Extracting career paths from the response using regex or text processing
-    career_paths = set()
-    if response and hasattr(response, '_result') and response._result.candidates:
-        for candidate in response._result.candidates:
-            generated_text = candidate.content.parts[0].text
-
-            # Extracting career paths from generated text
-            lines = generated_text.splitlines()
-            for line in lines:
-                # Assuming valid career paths are listed as bullet points
-                if re.match(r"^\s*[\*\-\•]\s*(.+)", line):
-                    career_name = re.search(r"^\s*[\*\-\•]\s*(.+)", line)
-                    if career_name:
-                        career_paths.add(career_name.group(1).strip())
-
-    return list(career_paths)
-
-def generate_career_growth_plan(user_data, career_paths, plan_years=5):
+    response = llm_gateway.generate_content("gemini-1.5-flash-002", prompt, generation_config)
+
+    career_paths = []
+    if response and response.text:
+        career_paths = [career.strip() for career in parse_json(response.text, STRING_LIST_SCHEMA) if career.strip()]
+
+    # Drop duplicates while keeping the model's order
+    return list(dict.fromkeys(career_paths))
+
+def build_growth_plan(career, suggested_courses, weekly_hours_available, plan_years=5):
+    """Divide the suggested courses and job steps for a career into years."""
+    growth_plan = {}
+    for year in range(1, plan_years + 1):
+        if year == 1:
+            # Short-term goals for year 1: take courses and acquire foundational skills
+            growth_plan[f'Year {year}'] = {
+                'courses': [f"Take course: {course['name']}" for course in suggested_courses[:min(3, len(suggested_courses))]],
+                'jobs': [f"Apply for internship or entry-level positions in {career}"],
+                'hours_per_week': weekly_hours_available
+            }
+        else:
+            # Long-term goals for subsequent years
+            growth_plan[f'Year {year}'] = {
+                'courses': [f"Take advanced course: {course['name']}" for course in suggested_courses[min(3, len(suggested_courses)):]],
+                'jobs': [f"Apply for mid-level positions in {career}", f"Work on projects related to {career}"],
+                'hours_per_week': weekly_hours_available
+            }
+    return growth_plan
+
+def generate_career_growth_plan(user_data, career_paths, plan_years=5, top_n=career_scoring.TOP_CAREERS):
     """Generate a detailed career growth plan for the user"""
     career_growth_plan = {}
     skills = user_data.get('skills', [])
     weekly_hours_available = user_data.get('weekly_hours_available', 10)
 
+    # Fetching the required skills for every career at once
+    required_skills_by_career = get_required_skills_for_careers(career_paths)
+    # Fastest-growing careers first, so careers that match the user equally well are kept by job growth
+    career_paths = career_resources.rank_careers_by_growth(career_paths)
+    # Only the best-matching careers get per-career course lookups
+    career_paths = career_scoring.prune_career_paths(skills, career_paths, required_skills_by_career, top_n)
+    growth_by_career = career_resources.fetch_job_growth_data_for_careers(career_paths)
+    courses_by_skill = {}
+
     for career in career_paths:
-        # Fetching the missing career skills for each career
-        required_skills = get_required_skills_for_career(career)
-        missing_skills = [skill for skill in required_skills if skill not in skills]
+        required_skills = required_skills_by_career[career]
+        missing_skills = career_scoring.missing_skills(skills, required_skills)
 
-        # Suggesting courses to bridge skill gaps (limit to top 5 courses)
+        # Suggesting courses to bridge skill gaps (limit to top 5 courses); skills shared by careers are fetched once
         suggested_courses = []
         for skill in missing_skills:
-            fetched_courses = career_resources.fetch_courses(skill)
-            suggested_courses.extend(fetched_courses[:5])
-
-        # Dividing growth plan into years
-        growth_plan = {}
-        for year in range(1, plan_years + 1):
-            if year == 1:
-                # Short-term goals for year 1: take courses and acquire foundational skills
-                growth_plan[f'Year {year}'] = {
-                    'courses': [f"Take course: {course['name']}" for course in suggested_courses[:min(3, len(suggested_courses))]],
-                    'jobs': [f"Apply for internship or entry-level positions in {career}"],
-                    'hours_per_week': weekly_hours_available
-                }
-            else:
-                # Long-term goals for subsequent years
-                growth_plan[f'Year {year}'] = {
-                    'courses': [f"Take advanced course: {course['name']}" for course in suggested_courses[min(3, len(suggested_courses)):]],
-                    'jobs': [f"Apply for mid-level positions in {career}", f"Work on projects related to {career}"],
-                    'hours_per_week': weekly_hours_available
-                }
-        
-        # Adding fallback plans based on hypothetical changes in immigration status
-        fallback_plans = generate_fallback_plans(user_data, career)
-
-        # Adding the career plan with fallback plans
+            key = career_resources.normalize_query(skill)
+            if key not in courses_by_skill:
+                courses_by_skill[key] = career_resources.fetch_courses(skill)
+            suggested_courses.extend(courses_by_skill[key][:COURSES_PER_SKILL])
+
+        # Adding the career plan with fallback plans based on hypothetical changes in immigration status
         career_growth_plan[career] = {
-            'growth_plan': growth_plan,
-            'fallback_plans': fallback_plans
+            'growth_plan': build_growth_plan(career, suggested_courses, weekly_hours_available, plan_years),
+            'fallback_plans': generate_fallback_plans(user_data, career),
+            'job_growth': growth_by_career.get(career, {})
         }
 
     return career_growth_plan
 
-def get_required_skills_for_career(career):
-    """Placeholder function to fetch required skills using an external AI"""
+async def _bounded(semaphore, coro, default):
+    """Await coro under the fan-out semaphore with a timeout, returning default if it fails."""
+    async with semaphore:
+        try:
+            return await asyncio.wait_for(coro, CALL_TIMEOUT)
+        except Exception as exc:
+            print(f"Career plan call failed: {exc!r}")
+            return default
+
+def _on_skills_lookup_done(task):
+    _pending_skills_lookups.discard(task)
+    # Mark the exception as retrieved; the caller has already logged it or moved on
+    if not task.cancelled():
+        task.exception()
+
+async def agenerate_career_growth_plan(user_data, career_paths, plan_years=5, on_career=None, top_n=career_scoring.TOP_CAREERS):
+    """Async generate_career_growth_plan: one batched skills lookup, then every course lookup runs concurrently.
+
+    Each career is assembled as soon as its own lookups finish, and
+    on_career(career, plan) is awaited for it in completion order, e.g. to show partial results.
+    """
+    skills = user_data.get('skills', [])
+    weekly_hours_available = user_data.get('weekly_hours_available', 10)
+    semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+    # One batched call (or none, once warmed up) instead of one per career. Shielded so a
+    # lookup that misses the deadline still finishes and caches its skills for the next plan.
+    lookup = asyncio.ensure_future(aget_required_skills_for_careers(career_paths))
+    _pending_skills_lookups.add(lookup)
+    lookup.add_done_callback(_on_skills_lookup_done)
+    try:
+        required_skills_by_career = await asyncio.wait_for(asyncio.shield(lookup), BATCH_TIMEOUT)
+    except Exception as exc:
+        print(f"Required skills lookup failed: {exc!r}")
+        required_skills_by_career = {}
+    # Fastest-growing careers first, so careers that match the user equally well are kept by job growth
+    career_paths = career_resources.rank_careers_by_growth(career_paths)
+    # Only the best-matching careers get per-career course lookups
+    career_paths = career_scoring.prune_career_paths(skills, career_paths, required_skills_by_career, top_n)
+    # Local lookup, no network
+    growth_by_career = career_resources.fetch_job_growth_data_for_careers(career_paths)
+
+    # Skills shared by several careers are looked up once per plan
+    course_lookups = {}
+
+    def courses_for(skill):
+        key = career_resources.normalize_query(skill)
+        if key not in course_lookups:
+            course_lookups[key] = asyncio.ensure_future(_bounded(semaphore, career_resources.afetch_courses(skill), []))
+        return course_lookups[key]
+
+    async def plan_career(career):
+        required_skills = required_skills_by_career.get(career, [])
+        missing_skills = career_scoring.missing_skills(skills, required_skills)
+        fetched = await asyncio.gather(*(courses_for(skill) for skill in missing_skills))
+        suggested_courses = [course for courses in fetched for course in courses[:COURSES_PER_SKILL]]
+        return career, {
+            'growth_plan': build_growth_plan(career, suggested_courses, weekly_hours_available, plan_years),
+            'fallback_plans': generate_fallback_plans(user_data, career),
+            'job_growth': growth_by_career.get(career, {})
+        }
+
+    plans = {}
+    for next_plan in asyncio.as_completed([plan_career(career) for career in career_paths]):
+        career, plan = await next_plan
+        plans[career] = plan
+        if on_career:
+            await on_career(career, plan)
+
+    # Same order as the pruned career_paths, like the sequential version
+    return {career: plans[career] for career in career_paths if career in plans}
+
+def normalize_career(career):
+    return " ".join(career.lower().split())
+
+def _required_skills_request(careers):
     generation_config = {
         "temperature": 0.8,
         "top_p": 0.9,
-        "max_output_tokens": 1000,
+        "max_output_tokens": 8192,
+        "response_mime_type": "application/json",
+        "response_schema": CAREER_SKILLS_SCHEMA,
     }
-
-    model = genai.GenerativeModel(
-        model_name="gemini-1.5-flash-002",
-        generation_config=generation_config,
+    prompt = (
+        f"For each of these careers, list all skills required to be successful in it: {json.dumps(careers)}. "
+        f"Respond with a JSON array with one object per career, of the form "
+        f"{{\"career\": <career exactly as given>, \"skills\": [<short skill names>]}}."
     )
+    return prompt, generation_config
+
+def _store_skills(response, careers):
+    """Parse a batch reply, cache each career's skills and return {normalized career: skills}."""
+    found = {}
+    if response and response.text:
+        for item in parse_json(response.text, CAREER_SKILLS_SCHEMA):
+            found[normalize_career(item['career'])] = [skill.strip() for skill in item['skills'] if skill.strip()]
+    for career in careers:
+        key = normalize_career(career)
+        if key in found:
+            career_skills_cache.set(key, found[key])
+        else:
+            print(f"No skills returned for career: {career}")
+    return found
 
-    prompt = f"List all skills required to be successful in a career as a {career}."
-    response = model.generate_content(prompt)
+def _split_cached(careers):
+    """Return ({normalized career: cached skills}, [careers still to look up, de-duplicated])."""
+    known = {}
+    missing = {}
+    for career in careers:
+        key = normalize_career(career)
+        if key in known or key in missing:
+            continue
+        cached = career_skills_cache.get(key)
+        if cached is not None:
+            known[key] = cached[0]
+        else:
+            missing[key] = career
+    return known, list(missing.values())
 
-    skills = []
-    if response and hasattr(response, '_result') and response._result.candidates:
-        generated_text = response._result.candidates[0].content.parts[0].text
-        skills = [skill.strip() for skill in generated_text.splitlines() if skill.strip()]
+def _chunks(items, size=SKILLS_BATCH_SIZE):
+    return [items[start:start + size] for start in range(0, len(items), size)]
 
-    return skills
+def get_required_skills_for_careers(careers):
+    """Required skills for many careers, as {career: [skills]}, from one Gemini call per batch.
+
+    Skills are memoized across users by normalized career title, so careers
+    seen before cost no call at all.
+    """
+    known, missing = _split_cached(careers)
+    for chunk in _chunks(missing):
+        prompt, generation_config = _required_skills_request(chunk)
+        response = llm_gateway.generate_content("gemini-1.5-flash-002", prompt, generation_config)
+        known.update(_store_skills(response, chunk))
+    return {career: known.get(normalize_career(career), []) for career in careers}
+
+async def aget_required_skills_for_careers(careers):
+    known, missing = _split_cached(careers)
+
+    async def lookup(chunk):
+        prompt, generation_config = _required_skills_request(chunk)
+        response = await llm_gateway.agenerate_content("gemini-1.5-flash-002", prompt, generation_config)
+        return _store_skills(response, chunk)
+
+    for found in await asyncio.gather(*(lookup(chunk) for chunk in _chunks(missing))):
+        known.update(found)
+    return {career: known.get(normalize_career(career), []) for career in careers}
+
+def get_required_skills_for_career(career):
+    """Placeholder function to fetch required skills using an external AI"""
+    return get_required_skills_for_careers([career])[career]
 
 def generate_fallback_plans(user_data, career):
     """Generate fallback plans in case of major changes in user's situation"""
@@ -154,32 +301,36 @@ def generate_fallback_plans(user_data, career):
     return fallback_plans
 
 # Testing the code
-user_id = "dummy_user"
-user_data = load_user_profile(user_id)
+if __name__ == "__main__":
+    user_id = "dummy_user"
+    user_data = load_user_profile(user_id)
 
-if user_data:
-    career_paths = recommend_career_path(user_data)
-    career_growth_plan = generate_career_growth_plan(user_data, career_paths)
+    if user_data:
+        career_paths = recommend_career_path(user_data)
+        career_growth_plan = asyncio.run(agenerate_career_growth_plan(user_data, career_paths))
 
-    # Displaying the results
-    print("\nCareer Recommendations:\n")
-    for career in career_paths:
-        print(f"- {career}")
-
-    print("\nCareer Growth Plan:\n")
-    for career, plan in career_growth_plan.items():
-        print(f"\nCareer: {career}")
-        for year, details in plan['growth_plan'].items():
-            print(f"  {year}:")
-            print("    Courses:")
-            for course in details['courses']:
-                print(f"      - {course}")
-            print("    Jobs:")
-            for job in details['jobs']:
-                print(f"      - {job}")
-            print(f"    Hours per week: {details['hours_per_week']}")
-        print("  Fallback Plans:")
-        for key, fallback in plan['fallback_plans'].items():
-            print(f"    - {key}: {fallback}")
-else:
-    print("User profile not found")
+        # Displaying the results
+        print("\nCareer Recommendations:\n")
+        for career in career_growth_plan:
+            print(f"- {career}")
+
+        print("\nCareer Growth Plan:\n")
+        for career, plan in career_growth_plan.items():
+            print(f"\nCareer: {career}")
+            for year, details in plan['growth_plan'].items():
+                print(f"  {year}:")
+                print("    Courses:")
+                for course in details['courses']:
+                    print(f"      - {course}")
+                print("    Jobs:")
+                for job in details['jobs']:
+                    print(f"      - {job}")
+                print(f"    Hours per week: {details['hours_per_week']}")
+            print("  Fallback Plans:")
+            for key, fallback in plan['fallback_plans'].items():
+                print(f"    - {key}: {fallback}")
+            if plan['job_growth']:
+                growth = plan['job_growth']
+                print(f"  Projected growth ({growth['occupation']}, {growth['years'][0]}-{growth['years'][-1]}): {growth['percent_change']}%")
+    else:
+        print("User profile not found")
@@ -1,43 +1,145 @@
-import requests
+import os
+import json
+from common import http_client
+from CalHacks_2024 import bls_store
+from common.cache import PersistentCache
+
+COURSERA_API_URL = "https://api.coursera.org/api/courses.v1"
+GOOGLE_MAPS_API_URL = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+
+COURSE_CACHE_TTL = int(os.environ.get("COURSE_CACHE_TTL", 7 * 24 * 3600))
+COURSE_CACHE_STALE_TTL = int(os.environ.get("COURSE_CACHE_STALE_TTL", 30 * 24 * 3600))
+course_cache = PersistentCache("courses", ttl=COURSE_CACHE_TTL, stale_ttl=COURSE_CACHE_STALE_TTL)
+
+# Serve courses from a local snapshot (see export_course_snapshot) and never call Coursera
+COURSES_OFFLINE = os.environ.get("COURSES_OFFLINE", "").lower() in ("1", "true", "yes")
+COURSE_SNAPSHOT_PATH = os.environ.get(
+    "COURSE_SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "course_snapshot.json")
+)
+SNAPSHOT_MATCH_LIMIT = 10
+
+_course_snapshot = None
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+def _parse_courses(data):
+    """Compact course records from a Coursera search response."""
+    courses = []
+    elements = data.get('elements', [])
+    for course in elements:
+        courses.append({
+            'name': course.get('name'),
+            'link': f"https://www.coursera.org/learn/{course.get('slug')}",
+            'duration': course.get('workload', 'Unknown')
+        })
+    return courses
+
+def _search_coursera(query):
+    """Query the Coursera search API. Raises on HTTP errors so they aren't cached."""
+    response = http_client.get(COURSERA_API_URL, params={'q': 'search', 'query': query})
+    response.raise_for_status()
+    return _parse_courses(response.json())
+
+async def _asearch_coursera(query):
+    response = await http_client.aget(COURSERA_API_URL, params={'q': 'search', 'query': query})
+    response.raise_for_status()
+    return _parse_courses(response.json())
+
+def load_course_snapshot(path=COURSE_SNAPSHOT_PATH):
+    global _course_snapshot
+    if _course_snapshot is None:
+        try:
+            with open(path, encoding="utf-8") as file:
+                _course_snapshot = json.load(file)
+        except FileNotFoundError:
+            print(f"Course snapshot not found at {path}")
+            _course_snapshot = {}
+    return _course_snapshot
+
+def snapshot_courses(query):
+    """Courses for query from the snapshot: the exact query if present, else courses whose names contain every query word."""
+    snapshot = load_course_snapshot()
+    key = normalize_query(query)
+    if key in snapshot:
+        return snapshot[key]
+    words = key.split()
+    matches = {}
+    for courses in snapshot.values():
+        for course in courses:
+            name = (course.get('name') or '').lower()
+            if words and all(word in name for word in words):
+                matches.setdefault(course['link'], course)
+    return list(matches.values())[:SNAPSHOT_MATCH_LIMIT]
+
+def export_course_snapshot(path=COURSE_SNAPSHOT_PATH):
+    """Write every cached course search to a snapshot file for offline mode."""
+    snapshot = dict(sorted(course_cache.items()))
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(snapshot, file, indent=1)
+    print(f"Wrote {len(snapshot)} course searches to {path}")
+    return len(snapshot)
 
 def fetch_courses(query):
     """Fetch training courses based on interests using external APIs"""
-    coursera_api_url = "https://api.coursera.org/api/courses.v1?q=search&query={}"
-    response = requests.get(coursera_api_url.format(query))
-    courses = []
+    if COURSES_OFFLINE:
+        return snapshot_courses(query)
+    try:
+        # Cached on disk by normalized query; concurrent identical queries share one request
+        return course_cache.get_or_compute(normalize_query(query), lambda: _search_coursera(query))
+    except Exception as exc:
+        print(f"Error fetching courses for '{query}': {exc}")
+        return []
 
-    if response.status_code == 200:
-        elements = response.json().get('elements', [])
-        for course in elements:
-            courses.append({
-                'name': course.get('name'),
-                'link': f"https://www.coursera.org/learn/{course.get('slug')}",
-                'duration': course.get('workload', 'Unknown')
-            })
-    return courses
+async def afetch_courses(query):
+    if COURSES_OFFLINE:
+        return snapshot_courses(query)
+    try:
+        return await course_cache.aget_or_compute(normalize_query(query), lambda: _asearch_coursera(query))
+    except Exception as exc:
+        print(f"Error fetching courses for '{query}': {exc}")
+        return []
+
+def _parse_centers(data):
+    centers = []
+    results = data.get('results', [])
+    for result in results:
+         centers.append({
+            'name': result.get('name'),
+            'address': result.get('formatted_address')
+        })
+    return centers
 
 def fetch_local_training_centers(location, interest):
     """Fetch local training centers using Google Maps API"""
-    google_maps_api_url = "https://maps.googleapis.com/maps/api/place/textsearch/json?query={}+in+{}&key=YOUR_GOOGLE_MAPS_API_KEY"
-    response = requests.get(google_maps_api_url.format(interest, location))
-    centers = []
+    try:
+        response = http_client.get(GOOGLE_MAPS_API_URL, params={'query': f"{interest} in {location}", 'key': 'YOUR_GOOGLE_MAPS_API_KEY'})
+    except Exception as exc:
+        print(f"Error fetching training centers: {exc}")
+        return []
+    return _parse_centers(response.json()) if response.status_code == 200 else []
 
-    if response.status_code == 200:
-        results = response.json().get('results', [])
-        for result in results:
-             centers.append({
-                'name': result.get('name'),
-                'address': result.get('formatted_address')
-            })
-    return centers
+async def afetch_local_training_centers(location, interest):
+    try:
+        response = await http_client.aget(GOOGLE_MAPS_API_URL, params={'query': f"{interest} in {location}", 'key': 'YOUR_GOOGLE_MAPS_API_KEY'})
+    except Exception as exc:
+        print(f"Error fetching training centers: {exc}")
+        return []
+    return _parse_centers(response.json()) if response.status_code == 200 else []
 
 def fetch_job_growth_data(career_path):
-    """Fetch job market growth data using Bureau of Labor Statistics or similar API"""
-    bls_api_url = "https://api.bls.gov/publicAPI/v2/timeseries/data/{}"
-    # Example placeholder for BLS series id related to the career path
-    response = requests.get(bls_api_url.format(career_path))
-    growth_data = {}
-
-    if response.status_code == 200:
-        growth_data = response.json().get('Results', {}).get('series', [{}])[0]
-    return growth_data
+    """Fetch job market growth data from the local BLS store (see bls_store)"""
+    return fetch_job_growth_data_for_careers([career_path]).get(career_path, {})
+
+def fetch_job_growth_data_for_careers(career_paths):
+    """Growth data for many careers in one vectorized lookup, as {career: data}; no network calls."""
+    store = bls_store.get_store()
+    return store.growth(career_paths) if store else {}
+
+def rank_careers_by_growth(career_paths):
+    """career_paths ordered by projected job growth, fastest first; unchanged if the BLS store isn't built."""
+    store = bls_store.get_store()
+    return store.rank_by_growth(career_paths) if store else list(career_paths)
+
+if __name__ == "__main__":
+    export_course_snapshot()
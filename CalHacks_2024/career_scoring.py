@@ -0,0 +1,50 @@
+import numpy as np
+
+from common.skills import skill_keys
+
+# Careers kept for the per-career course lookups in a growth plan
+TOP_CAREERS = 8
+
+# How much of a career's required skills the user already has, vs how many of the user's skills it uses
+COVERAGE_WEIGHT = 0.7
+RELEVANCE_WEIGHT = 0.3
+
+
+def _keys(skills):
+    # Descriptive names from the model ("Proficiency in Python") map to the taxonomy ids they mention
+    return {key for skill in skills if skill and skill.strip() for key in skill_keys(skill) if key}
+
+
+def score_careers(user_skills, career_paths, required_skills_by_career):
+    """Score every career against the user's skills in one pass over a careers x skills matrix."""
+    if not career_paths:
+        return np.zeros(0)
+    user_keys = _keys(user_skills)
+    required_keys = [_keys(required_skills_by_career.get(career, [])) for career in career_paths]
+    vocabulary = {key: i for i, key in enumerate(sorted(user_keys.union(*required_keys)))}
+    if not vocabulary:
+        return np.zeros(len(career_paths))
+
+    required = np.zeros((len(career_paths), len(vocabulary)), dtype=np.float32)
+    for row, keys in enumerate(required_keys):
+        required[row, [vocabulary[key] for key in keys]] = 1
+    user = np.zeros(len(vocabulary), dtype=np.float32)
+    user[[vocabulary[key] for key in user_keys]] = 1
+
+    overlap = required @ user
+    coverage = overlap / np.maximum(required.sum(axis=1), 1)
+    relevance = overlap / max(user.sum(), 1)
+    return COVERAGE_WEIGHT * coverage + RELEVANCE_WEIGHT * relevance
+
+
+def prune_career_paths(user_skills, career_paths, required_skills_by_career, top_n=TOP_CAREERS):
+    """The top_n careers by score, best first; ties keep the order of career_paths."""
+    scores = score_careers(user_skills, career_paths, required_skills_by_career)
+    order = np.argsort(-scores, kind="stable")[:top_n]
+    return [career_paths[i] for i in order]
+
+
+def missing_skills(user_skills, required_skills):
+    """Required skills the user doesn't have, comparing taxonomy ids rather than raw text."""
+    user_keys = _keys(user_skills)
+    return [skill for skill in required_skills if skill.strip() and not user_keys.intersection(skill_keys(skill))]
@@ -0,0 +1,172 @@
+import os
+import time
+import copy
+import asyncio
+import threading
+from collections import OrderedDict
+
+import firebase_admin
+from firebase_admin import credentials, firestore, firestore_async
+
+CRED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "firebase-credentials.json")
+USERS_COLLECTION = "users"
+
+PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", 15 * 60))
+PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", 1024))
+
+# Updates to the same user within this many seconds are merged into one write
+WRITE_BEHIND_WINDOW = float(os.environ.get("PROFILE_WRITE_WINDOW", 2))
+# Firestore's limit on writes per batch
+MAX_BATCH_WRITES = 500
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def _init_app():
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        firebase_admin.initialize_app(credentials.Certificate(CRED_PATH))
+
+
+def get_client():
+    """The process-wide Firestore client, initializing Firebase on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _init_app()
+                _client = firestore.client()
+    return _client
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _init_app()
+                _async_client = firestore_async.client()
+    return _async_client
+
+
+class ProfileCache:
+    """In-memory LRU of user profiles with a TTL. A cached None means the user has no profile yet."""
+
+    def __init__(self, max_size=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return (hit, profile); profiles are copies so callers can't mutate the cache."""
+        with self._lock:
+            entry = self._profiles.get(user_id)
+            if entry is None:
+                return False, None
+            profile, expires = entry
+            if expires <= time.monotonic():
+                del self._profiles[user_id]
+                return False, None
+            self._profiles.move_to_end(user_id)
+            return True, copy.deepcopy(profile)
+
+    def set(self, user_id, profile):
+        with self._lock:
+            self._profiles[user_id] = (copy.deepcopy(profile), time.monotonic() + self.ttl)
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.max_size:
+                self._profiles.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._profiles.pop(user_id, None)
+
+
+class WriteBehindQueue:
+    """Buffers profile updates and commits them to Firestore in batches.
+
+    Updates to the same user within `window` seconds are merged field by field
+    and written once with set(..., merge=True), so callers never wait on
+    Firestore. Call flush() on shutdown to write whatever is still pending.
+    """
+
+    def __init__(self, window=WRITE_BEHIND_WINDOW):
+        self.window = window
+        self.pending = {}
+        self._flush_task = None
+        self._lock = None
+
+    def update(self, user_id, fields):
+        """Queue a field-level update; must be called from the event loop."""
+        self.pending.setdefault(user_id, {}).update(copy.deepcopy(fields))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    def pending_fields(self, user_id):
+        return copy.deepcopy(self.pending.get(user_id, {}))
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while self.pending:
+                writes, self.pending = self.pending, {}
+                try:
+                    await self._commit(writes)
+                except Exception as exc:
+                    print(f"Error writing {len(writes)} profiles to Firestore: {exc}")
+                    # Put them back under anything queued since, and retry on the next flush
+                    for user_id, fields in writes.items():
+                        self.pending[user_id] = {**fields, **self.pending.get(user_id, {})}
+                    return
+
+    async def _commit(self, writes):
+        client = get_async_client()
+        items = list(writes.items())
+        for start in range(0, len(items), MAX_BATCH_WRITES):
+            batch = client.batch()
+            for user_id, fields in items[start:start + MAX_BATCH_WRITES]:
+                batch.set(client.collection(USERS_COLLECTION).document(user_id), fields, merge=True)
+            await batch.commit()
+
+
+profile_cache = ProfileCache()
+profile_writes = WriteBehindQueue()
+
+
+def load_profile(user_id):
+    """Read-through: the user's profile dict, or None if they haven't saved one."""
+    hit, profile = profile_cache.get(user_id)
+    if not hit:
+        doc = get_client().collection(USERS_COLLECTION).document(user_id).get()
+        profile = doc.to_dict() if doc.exists else None
+        profile_cache.set(user_id, profile)
+    # Writes still waiting in the queue are newer than Firestore
+    pending = profile_writes.pending_fields(user_id)
+    if pending:
+        profile = {**(profile or {}), **pending}
+    return profile
+
+
+def update_profile(user_id, fields):
+    """Write-behind: update the cached profile now and queue the Firestore write."""
+    hit, profile = profile_cache.get(user_id)
+    if hit:
+        profile_cache.set(user_id, {**(profile or {}), **fields})
+    profile_writes.update(user_id, fields)
+
+
+async def flush_profile_writes():
+    await profile_writes.flush()
+
+
+def invalidate_profile(user_id):
+    profile_cache.invalidate(user_id)
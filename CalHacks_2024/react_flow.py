@@ -0,0 +1,24 @@
+import reflex as rx
+from typing import Any
+
+
+class ReactFlowLib(rx.Component):
+    library = "reactflow@11.11.4"
+
+    def _get_custom_code(self) -> str:
+        return """import 'reactflow/dist/style.css';"""
+
+class ReactFlow(ReactFlowLib):
+    tag = "ReactFlow"
+
+    nodes: rx.Var[list[dict[str, Any]]]
+    edges: rx.Var[list[dict[str, Any]]]
+    fit_view: rx.Var[bool]
+    nodes_draggable: rx.Var[bool]
+    nodes_connectable: rx.Var[bool]
+
+class Background(ReactFlowLib):
+    tag = "Background"
+
+class Controls(ReactFlowLib):
+    tag = "Controls"
@@ -1,12 +1,23 @@
 import reflex as rx
-from openai import AsyncOpenAI
-import google.generativeai as genai
-import os
-import json
+import asyncio
 from dotenv import load_dotenv
+from common import llm_gateway
+from common.json_utils import parse_json
+from common.skills import extract_skills, skill_label, canonical_skill, canonical_skill_ids
+from chatapp.validators import validate_answer
 
 load_dotenv()
 
+SKILLS_SCHEMA = {"type": "array", "items": {"type": "string"}}
+
+# Set by the app to persist survey progress: saver(user_id, chat_history, current_question_index)
+_progress_saver = None
+
+
+def set_progress_saver(saver):
+    global _progress_saver
+    _progress_saver = saver
+
 class State(rx.State):
     # The current question being asked
     question: str
@@ -35,10 +46,17 @@ class State(rx.State):
     # Index of the current question
     current_question_index: int = 0
 
+    # Signed-in user whose survey progress is saved; set by the app on login
+    user_id: str = ""
+
     async def verify_input(self, question: str, answer: str) -> tuple[bool, str]:
-        client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
+        # Clearly valid (or clearly invalid) answers are decided locally; only ambiguous text goes to the LLM
+        if question in self.questions:
+            local_result = validate_answer(self.questions.index(question), answer)
+            if local_result is not None:
+                return local_result
 
-        response = await client.chat.completions.create(
+        response = await llm_gateway.chat_completion(
             model="gpt-4",  # Use the appropriate model
             messages=[
                 {"role": "system", "content": "You are a very understanding and empathetic AI assistant verifying user input for an immigration survey. Respond with only the word 'valid' verbatim if the input is appropriate for the question, otherwise explain to the user what they should type instead very empathetically and very clearly. Assume these individuals don't speak English as a first language."},
@@ -61,87 +79,126 @@ class State(rx.State):
         self.location = ""
         self.chat_history = [("", self.greeting_message), ("", "What is your updated immigration status?")]
         self.current_question_index = 0
+        self._save_progress()
 
-    async def get_skills(self, skills_text: str) -> list[str]:
-        client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    def _save_progress(self):
+        if self.user_id and _progress_saver:
+            _progress_saver(self.user_id, self.chat_history, self.current_question_index)
 
-        response = await client.chat.completions.create(
-            model="gpt-4",
+    async def get_skills(self, skills_text: str) -> list[str]:
+        # Skills found in the bundled taxonomy are extracted locally; the LLM only sees what's left
+        skill_ids, unmatched = extract_skills(skills_text)
+        skills = [skill_label(skill_id) for skill_id in skill_ids]
+        if not unmatched:
+            return skills
+
+        response = await llm_gateway.chat_completion(
+            model="gpt-4-turbo",
             messages=[
-                {"role": "system", "content": "You are an advanced AI assistant. The user has listed skills as part of a survey. Your task is to extract the individual skills from their response and output them as an array of skills."},
-                {"role": "user", "content": f"Extract the skills from the following text: {skills_text}, in an array"}
+                {"role": "system", "content": "You are an advanced AI assistant. The user has listed skills as part of a survey. Your task is to extract the individual skills from their response and output them as a JSON object of the form {\"skills\": [\"skill 1\", \"skill 2\"]}."},
+                {"role": "user", "content": f"Extract the skills from the following text: {'; '.join(unmatched)}"}
             ],
-            temperature=1.2
+            response_format={"type": "json_object"},
+            temperature=0
         )
-        skills_array = json.loads(response.choices[0].message.content)
-        return skills_array
-
-    async def answer(self):
-        client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
-
-        if not self.question:
-            return
-        
-        # Verify user input
-        validity, interpretation = await self.verify_input(self.questions[self.current_question_index], self.question)
-        if not validity:
-            # self.chat_history.append((self.questions[self.current_question_index], self.question))  # Store invalid response
-            self.chat_history.append((self.question, ""))
-            self.chat_history.append(("", interpretation))  # Add the feedback on invalid input
-            self.question = ""
-            yield
-            return
-
-        # Add user's valid response to chat history
-        self.chat_history.append((self.question, ""))
-
+        known = set(canonical_skill_ids(skills))
+        for skill in parse_json(response.choices[0].message.content, SKILLS_SCHEMA):
+            key, label = canonical_skill(skill)
+            if key and key not in known:
+                known.add(key)
+                skills.append(label)
+        return skills
+
+    async def _stream_follow_up(self, question: str, answer: str, next_question_index: int, tokens: asyncio.Queue):
+        """Stream the follow-up message into tokens, ending with None. Runs speculatively alongside verify_input."""
         # Prepare the next question or finish the survey
-        if self.current_question_index < len(self.questions) - 1:
-            next_question = self.questions[self.current_question_index + 1]
+        if next_question_index < len(self.questions):
+            next_question = self.questions[next_question_index]
             system_message = f"Ask the user: {next_question}"
         else:
             system_message = "Thank the user for completing the survey and provide a brief summary of their responses."
 
-        # AI generates a response for the next question or closing
-        session = await client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a very understanding, compassionate, and empathetic AI assistant conducting an immigration survey. Provide helpful responses based on the user's answers."},
-                {"role": "user", "content": f"User's response to '{self.questions[self.current_question_index]}': {self.question}"},
-                {"role": "system", "content": system_message}
-            ],
-            temperature=0.7,
-            stream=True,
-        )
+        session = None
+        try:
+            # AI generates a response for the next question or closing
+            session = await llm_gateway.chat_completion(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": "You are a very understanding, compassionate, and empathetic AI assistant conducting an immigration survey. Provide helpful responses based on the user's answers."},
+                    {"role": "user", "content": f"User's response to '{question}': {answer}"},
+                    {"role": "system", "content": system_message}
+                ],
+                temperature=0.7,
+                stream=True,
+            )
+            async for item in session:
+                if hasattr(item.choices[0].delta, "content"):
+                    if item.choices[0].delta.content is None:
+                        break
+                    await tokens.put(item.choices[0].delta.content)
+        finally:
+            # Release the connection right away if the stream was cancelled because validation failed
+            close = getattr(session, "close", None) or getattr(session, "aclose", None)
+            if close:
+                await close()
+            tokens.put_nowait(None)
 
-        # Store the chatbot's response
-        answer = ""
+    async def answer(self):
+        if not self.question:
+            return
+
+        question_index = self.current_question_index
+        question = self.questions[question_index]
 
-        # Clear the question input
+        # Validation, the follow-up stream and skill extraction all start at once.
+        # Streamed tokens are buffered until validation passes and discarded if it fails.
+        tokens = asyncio.Queue()
+        validation = asyncio.create_task(self.verify_input(question, self.question))
+        follow_up = asyncio.create_task(self._stream_follow_up(question, self.question, question_index + 1, tokens))
+        skills_extraction = asyncio.create_task(self.get_skills(self.question)) if question_index == 3 else None
+
+        # Add the user's response to chat history and clear the question input
+        self.chat_history.append((self.question, ""))
         self.prev_question = self.question
         self.question = ""
         yield  # Clear the frontend input before continuing
 
-        async for item in session:
-            if hasattr(item.choices[0].delta, "content"):
-                if item.choices[0].delta.content is None:
-                    break
-                answer += item.choices[0].delta.content
-                self.chat_history[-1] = (
-                    self.chat_history[-1][0],
-                    answer,
-                )
-                yield
+        try:
+            validity, interpretation = await validation
+        except Exception:
+            follow_up.cancel()
+            if skills_extraction:
+                skills_extraction.cancel()
+            raise
+        if not validity:
+            follow_up.cancel()
+            if skills_extraction:
+                skills_extraction.cancel()
+            self.chat_history.append(("", interpretation))  # Add the feedback on invalid input
+            yield
+            return
+
+        # Store the chatbot's response
+        answer = ""
+        while (token := await tokens.get()) is not None:
+            answer += token
+            self.chat_history[-1] = (
+                self.chat_history[-1][0],
+                answer,
+            )
+            yield
+        # Surface any error from opening the stream
+        await follow_up
 
         # Update state based on user responses
-        if not self.current_question_index:
+        if not question_index:
             self.immigration_status = self.prev_question
-        elif self.current_question_index == 1:
+        elif question_index == 1:
             self.when_moved = self.prev_question
-        elif self.current_question_index == 2:
+        elif question_index == 2:
             self.education = self.prev_question
-        elif self.current_question_index == 3:
-            self.skills = await self.get_skills(answer)
+        elif question_index == 3:
+            self.skills = await skills_extraction
         else:
             self.location = self.prev_question
 
@@ -151,4 +208,4 @@ class State(rx.State):
         # If the survey is finished, disable further input
         if self.current_question_index >= len(self.questions):
             self.current_question_index = -1
-            
\ No newline at end of file
+        self._save_progress()
@@ -0,0 +1,173 @@
+import re
+import datetime
+import unicodedata
+
+# Local validators for the survey questions in chatapp.state.State.questions.
+# Each returns (True, "valid") for a clearly valid answer, (False, feedback) for a
+# clearly invalid one, or None when the answer is ambiguous and the LLM should decide.
+
+VALID = (True, "valid")
+
+# First three digits of a ZIP code -> state, from the USPS ZIP prefix ranges
+ZIP3_RANGES = [
+    (5, 5, "NY"), (6, 9, "PR"), (10, 27, "MA"), (28, 29, "RI"), (30, 38, "NH"),
+    (39, 49, "ME"), (50, 54, "VT"), (55, 55, "MA"), (56, 59, "VT"), (60, 69, "CT"),
+    (70, 89, "NJ"), (90, 99, "AE"), (100, 149, "NY"), (150, 196, "PA"), (197, 199, "DE"),
+    (200, 205, "DC"), (206, 219, "MD"), (220, 246, "VA"), (247, 268, "WV"), (270, 289, "NC"),
+    (290, 299, "SC"), (300, 319, "GA"), (320, 349, "FL"), (350, 369, "AL"), (370, 385, "TN"),
+    (386, 397, "MS"), (398, 399, "GA"), (400, 427, "KY"), (430, 459, "OH"), (460, 479, "IN"),
+    (480, 499, "MI"), (500, 528, "IA"), (530, 549, "WI"), (550, 567, "MN"), (569, 569, "DC"),
+    (570, 577, "SD"), (580, 588, "ND"), (590, 599, "MT"), (600, 629, "IL"), (630, 658, "MO"),
+    (660, 679, "KS"), (680, 693, "NE"), (700, 714, "LA"), (716, 729, "AR"), (730, 749, "OK"),
+    (750, 799, "TX"), (800, 816, "CO"), (820, 831, "WY"), (832, 838, "ID"), (840, 847, "UT"),
+    (850, 865, "AZ"), (870, 884, "NM"), (885, 885, "TX"), (889, 898, "NV"), (900, 961, "CA"),
+    (962, 966, "AP"), (967, 968, "HI"), (969, 969, "GU"), (970, 979, "OR"), (980, 994, "WA"),
+    (995, 999, "AK"),
+]
+ZIP3_TO_STATE = {zip3: state for low, high, state in ZIP3_RANGES for zip3 in range(low, high + 1)}
+
+ZIPCODE_RE = re.compile(r"^\s*(\d{5})(?:-\d{4})?\s*$")
+
+# Month names in the languages our users most often answer in (accents stripped)
+MONTHS = {
+    1: ["january", "jan", "enero", "ene", "janvier", "janv", "janeiro", "januar"],
+    2: ["february", "feb", "febrero", "fevrier", "fev", "fevereiro", "februar"],
+    3: ["march", "mar", "marzo", "mars", "marco", "marz"],
+    4: ["april", "apr", "abril", "abr", "avril", "avr"],
+    5: ["may", "mayo", "mai", "maio"],
+    6: ["june", "jun", "junio", "juin", "junho", "juni"],
+    7: ["july", "jul", "julio", "juillet", "juil", "julho", "juli"],
+    8: ["august", "aug", "agosto", "ago", "aout"],
+    9: ["september", "sep", "sept", "septiembre", "setiembre", "septembre", "setembro", "set"],
+    10: ["october", "oct", "octubre", "octobre", "outubro", "out", "oktober", "okt"],
+    11: ["november", "nov", "noviembre", "novembre", "novembro"],
+    12: ["december", "dec", "diciembre", "dic", "decembre", "dezembro", "dez", "dezember"],
+}
+MONTH_NAMES = {name: month for month, names in MONTHS.items() for name in names}
+DATE_FILLER_WORDS = {"de", "del", "of", "the", "in", "en", "em", "le", "im", "on", "el", "th", "st", "nd", "rd"}
+NUMERIC_DATE_FORMATS = ["%m/%d/%Y", "%m-%d-%Y", "%Y-%m-%d", "%Y/%m/%d", "%d.%m.%Y", "%m/%d/%y", "%m/%Y", "%Y-%m", "%Y"]
+
+EDUCATION_TERMS = [
+    # English
+    "no formal education", "none", "primary school", "elementary school", "middle school", "high school",
+    "ged", "diploma", "associate", "some college", "college", "university", "bachelor", "bachelors",
+    "bsc", "master", "masters", "msc", "mba", "phd", "doctorate",
+    "vocational", "trade school", "certificate",
+    # Spanish
+    "primaria", "secundaria", "preparatoria", "bachillerato", "licenciatura", "universidad",
+    "maestria", "doctorado", "tecnico",
+    # French
+    "ecole primaire", "lycee", "baccalaureat", "licence", "doctorat",
+    # Portuguese
+    "ensino fundamental", "ensino medio", "graduacao", "mestrado", "doutorado",
+]
+
+# BA/BS/MA/MS/MD are ordinary words too ("ms word", "ma cooking"), so they only count in degree
+# forms: punctuated ("B.S.", "m.a."), followed by "degree", capitalized before "in", or as the whole answer
+DEGREE_ABBREVIATION_RE = re.compile(
+    r"(?i:\b[bm]\.\s?[as]\b\.?|\bm\.\s?d\b\.?|\b(?:ba|bs|ma|ms|md)\s+degree\b|^(?:ba|bs|ma|ms|md)\.?$)"
+    r"|\b(?:BA|BS|MA|MS|MD)\s+in\b"
+)
+
+IMMIGRATION_STATUS_TERMS = [
+    "citizen", "green card", "greencard", "permanent resident", "lpr", "conditional resident",
+    "refugee", "asylee", "asylum", "asylum seeker", "parole", "parolee", "humanitarian parole",
+    "tps", "temporary protected status", "daca", "undocumented", "visa", "student visa",
+    "work visa", "tourist visa", "f1", "m1", "j1", "h1b", "h2a", "h2b", "h4", "l1", "o1",
+    # "tn" alone is also Tennessee, so it needs visa context
+    "b1", "b2", "k1", "tn visa", "tn status", "e2", "u visa", "t visa", "refugiado", "asilo", "residente permanente",
+    "ciudadano", "residente", "refugie", "demandeur d asile",
+]
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^a-z0-9/.\-]", " ", text).split())
+
+
+def _contains_term(text, terms):
+    # Match on word boundaries, ignoring hyphens so "H-1B" and "h1b" both match "h1b"
+    padded = f" {re.sub(r'[-.]', '', text)} "
+    return any(f" {term} " in padded for term in terms)
+
+
+def validate_zipcode(answer):
+    match = ZIPCODE_RE.match(answer)
+    if not match:
+        return None
+    if int(match.group(1)[:3]) not in ZIP3_TO_STATE:
+        return (False, f"I couldn't find {match.group(1)} as a US zipcode. Could you please check it and type your 5-digit zipcode again? For example: 94704.")
+    return VALID
+
+
+def parse_date(answer):
+    """Parse a date in common numeric or written formats, in several languages. Returns a date or None."""
+    text = normalize(answer)
+    for date_format in NUMERIC_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+
+    month = year = day = None
+    for token in re.split(r"[\s/.\-,]+", text):
+        token = re.sub(r"(st|nd|rd|th)$", "", token) if token[:1].isdigit() else token
+        if not token or token in DATE_FILLER_WORDS:
+            continue
+        if token in MONTH_NAMES and month is None:
+            month = MONTH_NAMES[token]
+        elif token.isdigit() and len(token) == 4 and year is None:
+            year = int(token)
+        elif token.isdigit() and len(token) <= 2 and day is None:
+            day = int(token)
+        else:
+            return None
+    if month is None or year is None:
+        return None
+    try:
+        return datetime.date(year, month, day or 1)
+    except ValueError:
+        return None
+
+
+def validate_arrival_date(answer):
+    date = parse_date(answer)
+    if date is None:
+        return None
+    if date > datetime.date.today():
+        return (False, "That date is in the future. Could you please tell me the date you arrived in the US? For example: March 2020 or 03/15/2020.")
+    if date.year < 1900:
+        return None
+    return VALID
+
+
+def validate_education(answer):
+    text = normalize(answer)
+    if len(text.split()) <= 12 and (_contains_term(text, EDUCATION_TERMS) or DEGREE_ABBREVIATION_RE.search(answer.strip())):
+        return VALID
+    return None
+
+
+def validate_immigration_status(answer):
+    text = normalize(answer)
+    if len(text.split()) <= 12 and _contains_term(text, IMMIGRATION_STATUS_TERMS):
+        return VALID
+    return None
+
+
+# Indexed like State.questions; skills are free text and always go to the LLM
+QUESTION_VALIDATORS = [
+    validate_immigration_status,
+    validate_arrival_date,
+    validate_education,
+    None,
+    validate_zipcode,
+]
+
+
+def validate_answer(question_index, answer):
+    if not 0 <= question_index < len(QUESTION_VALIDATORS) or not answer.strip():
+        return None
+    validator = QUESTION_VALIDATORS[question_index]
+    return validator(answer) if validator else None
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from concurrent.futures import Future
+
+CACHE_DB_PATH = os.environ.get("SETTLING_CACHE_DB", os.path.join(".cache", "settling.sqlite3"))
+
+
+class PersistentCache:
+    """Cross-session cache stored in SQLite on local disk.
+
+    Entries are fresh for `ttl` seconds and may then be served stale for another
+    `stale_ttl` seconds while a single background refresh runs
+    (stale-while-revalidate). Concurrent misses for the same key are coalesced
+    into a single call of `compute`, for both threaded and async callers.
+    Values must be JSON serializable. With cache_empty=False, empty values are
+    returned to callers but never stored.
+    """
+
+    def __init__(self, namespace, ttl, stale_ttl=0, db_path=CACHE_DB_PATH, cache_empty=True):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache_empty = cache_empty
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._ainflight = {}
+        self._background_tasks = set()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return (value, is_fresh), or None if the key is missing or too stale to serve."""
+        row = self._connect().execute(
+            "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        now = time.time()
+        if now > expires + self.stale_ttl:
+            return None
+        return json.loads(value), now <= expires
+
+    def set(self, key, value, ttl=None):
+        if not value and not self.cache_empty:
+            return
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), expires),
+            )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def items(self):
+        """Return every (key, value) pair in this namespace that can still be served."""
+        rows = self._connect().execute(
+            "SELECT key, value FROM cache WHERE namespace = ? AND expires >= ?",
+            (self.namespace, time.time() - self.stale_ttl),
+        ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def _compute_once(self, key, compute):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future
+
+        try:
+            value = compute()
+            self.set(key, value)
+            future.set_result(value)
+        except Exception as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, calling compute() on a miss."""
+        cached = self.get(key)
+        if cached is not None:
+            value, is_fresh = cached
+            if not is_fresh and key not in self._inflight:
+                threading.Thread(target=self._compute_once, args=(key, compute), daemon=True).start()
+            return value
+        return self._compute_once(key, compute).result()
+
+    async def _acompute_once(self, key, compute):
+        # The computation runs in its own task and every caller awaits it shielded, so a caller
+        # that is cancelled or times out never cancels the result the other callers are waiting on
+        task = self._ainflight.get(key)
+        if task is None:
+            task = self._ainflight[key] = asyncio.ensure_future(self._acompute_and_store(key, compute))
+            task.add_done_callback(lambda done: self._on_acompute_done(key, done))
+        return await asyncio.shield(task)
+
+    async def _acompute_and_store(self, key, compute):
+        value = await compute()
+        self.set(key, value)
+        return value
+
+    def _on_acompute_done(self, key, task):
+        if self._ainflight.get(key) is task:
+            del self._ainflight[key]
+        # Mark the exception as retrieved; callers still awaiting it get it re-raised
+        if not task.cancelled():
+            task.exception()
+
+    def _on_background_done(self, task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error refreshing cache entry in '{self.namespace}': {task.exception()}")
+
+    async def aget_or_compute(self, key, compute):
+        """Async version of get_or_compute; compute is a coroutine function."""
+        cached = self.get(key)
+        if cached is not None:
+            value, is_fresh = cached
+            if not is_fresh and key not in self._ainflight:
+                task = asyncio.create_task(self._acompute_once(key, compute))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._on_background_done)
+            return value
+        return await self._acompute_once(key, compute)
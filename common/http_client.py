@@ -0,0 +1,97 @@
+"""Shared, pooled HTTP clients for calls to external APIs.
+
+One httpx.Client for threads and one httpx.AsyncClient per event loop, with
+keep-alive connection pools, HTTP/2 when the optional h2 package is
+installed, and connect/read timeouts so a hung upstream can't hold a worker.
+Async GETs can optionally be hedged: if the first attempt hasn't answered
+after `hedge_after` seconds a second one is started and whichever finishes
+first wins.
+"""
+import os
+import asyncio
+import threading
+import weakref
+
+import httpx
+
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 10))
+# Seconds before a slow GET is hedged with a second attempt; unset disables hedging
+HEDGE_AFTER = float(os.environ["HTTP_HEDGE_AFTER"]) if os.environ.get("HTTP_HEDGE_AFTER") else None
+
+TIMEOUT = httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30)
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class HTTPClient:
+    def __init__(self, timeout=TIMEOUT, limits=LIMITS, hedge_after=HEDGE_AFTER):
+        self.timeout = timeout
+        self.limits = limits
+        self.hedge_after = hedge_after
+        self.http2 = _http2_available()
+        self._client = None
+        self._lock = threading.Lock()
+        # httpx connection pools can't be shared between event loops
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(timeout=self.timeout, limits=self.limits, http2=self.http2,
+                                            follow_redirects=True)
+        return self._client
+
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, http2=self.http2,
+                                       follow_redirects=True)
+            self._async_clients[loop] = client
+        return client
+
+    def get_sync(self, url, **kwargs):
+        """Blocking GET on the shared pool; safe to call from many threads at once."""
+        return self.client().get(url, **kwargs)
+
+    async def get(self, url, hedge_after=None, **kwargs):
+        hedge_after = self.hedge_after if hedge_after is None else hedge_after
+        client = self.async_client()
+        if not hedge_after:
+            return await client.get(url, **kwargs)
+
+        attempts = [asyncio.create_task(client.get(url, **kwargs))]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+            if not done:
+                attempts.append(asyncio.create_task(client.get(url, **kwargs)))
+            # First successful attempt wins; only fail when every attempt has failed
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        return attempt.result()
+            return attempts[-1].result()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def aclose(self):
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+http = HTTPClient()
+
+get = http.get_sync
+aget = http.get
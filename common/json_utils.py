@@ -0,0 +1,224 @@
+import re
+import ast
+import json
+
+# Schemas use the OpenAPI subset Gemini accepts as response_schema:
+# {"type": "object", "properties": {...}, "required": [...]}, {"type": "array", "items": {...}}, ...
+PYTHON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+CODE_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+class JSONParseError(ValueError):
+    pass
+
+
+def extract_json(text):
+    """Cut the outermost JSON object or array out of a model reply (code fences, prose around it)."""
+    fenced = CODE_FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise JSONParseError("No JSON object or array found in the response.")
+    start = min(starts)
+
+    depth = 0
+    quote = None
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    # Unterminated, e.g. the reply hit max_output_tokens; repair_json closes it
+    return text[start:]
+
+
+def close_json(text):
+    """Close any string, array or object left open at the end of text."""
+    stack = []
+    quote = None
+    escaped = False
+    for char in text:
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if quote:
+        text += quote
+    text = text.rstrip().rstrip(",").rstrip(":")
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text):
+    text = text.translate(SMART_QUOTES)
+    text = close_json(text)
+    return TRAILING_COMMA_RE.sub(r"\1", text)
+
+
+def _is_json_value(value):
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and _is_json_value(item) for key, item in value.items())
+    if isinstance(value, list):
+        return all(_is_json_value(item) for item in value)
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _loads(text):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    # Single quotes and True/False/None, as in Python-literal pseudo-JSON
+    pythonish = re.sub(r"\btrue\b", "True", re.sub(r"\bfalse\b", "False", re.sub(r"\bnull\b", "None", text)))
+    for candidate in (text, pythonish):
+        try:
+            value = ast.literal_eval(candidate)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            continue
+        # Reject sets and tuples, e.g. {"na"} from a truncated key
+        if _is_json_value(value):
+            return value
+    raise JSONParseError(f"Unable to parse JSON: {text[:200]}")
+
+
+def _loads_truncated(text, max_attempts=20):
+    """Repair text, dropping trailing incomplete elements one at a time until it parses."""
+    for _ in range(max_attempts):
+        try:
+            return _loads(repair_json(text))
+        except JSONParseError:
+            cut = text.rfind(",")
+            if cut == -1:
+                raise
+            text = text[:cut]
+    raise JSONParseError(f"Unable to parse JSON: {text[:200]}")
+
+
+def validate(value, schema, path="$"):
+    """Check value against schema, returning it (possibly unwrapped) or raising JSONParseError."""
+    expected = schema.get("type", "").lower()
+    if expected == "array" and isinstance(value, dict) and len(value) == 1:
+        # {"skills": [...]} when a bare list was asked for
+        (only,) = value.values()
+        if isinstance(only, list):
+            value = only
+    if expected in ("integer", "number") and isinstance(value, str):
+        try:
+            value = int(value) if expected == "integer" else float(value)
+        except ValueError:
+            pass
+
+    python_type = PYTHON_TYPES.get(expected)
+    if python_type and not isinstance(value, python_type):
+        raise JSONParseError(f"{path}: expected {expected}, got {type(value).__name__}")
+
+    if expected == "object":
+        for key in schema.get("required", []):
+            if key not in value:
+                raise JSONParseError(f"{path}: missing required key '{key}'")
+        for key, subschema in schema.get("properties", {}).items():
+            if key in value:
+                value[key] = validate(value[key], subschema, f"{path}.{key}")
+    elif expected == "array" and "items" in schema:
+        value = [validate(item, schema["items"], f"{path}[{i}]") for i, item in enumerate(value)]
+    return value
+
+
+def parse_json(text, schema=None):
+    """Parse a model reply as JSON, repairing near-valid output locally instead of re-asking the model."""
+    if text is None:
+        raise JSONParseError("Empty response.")
+    raw = extract_json(text)
+    try:
+        value = _loads(raw)
+    except JSONParseError:
+        value = _loads_truncated(raw)
+    return validate(value, schema) if schema else value
+
+
+class JSONArrayStream:
+    """Incremental parser that yields the items of a named array as soon as each one closes.
+
+    Feed it the chunks of a streamed completion:
+
+        stream = JSONArrayStream("years")
+        for chunk in chunks:
+            for year in stream.feed(chunk):
+                ...
+
+    Only object items are emitted; items that fail to parse are skipped.
+    """
+
+    def __init__(self, array_key):
+        self.array_key = array_key
+        self.text = ""
+        self._position = 0
+        # One entry per open container: [bracket, key it's the value of, start offset, last string seen inside]
+        self._stack = []
+        self._quote_start = None
+        self._escaped = False
+
+    def feed(self, chunk):
+        self.text += chunk
+        items = []
+        text = self.text
+        for i in range(self._position, len(text)):
+            char = text[i]
+            if self._quote_start is not None:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    if self._stack:
+                        self._stack[-1][3] = text[self._quote_start + 1:i]
+                    self._quote_start = None
+            elif char == '"':
+                self._quote_start = i
+            elif char in "{[":
+                # Inside an object, the last string before a container is its key
+                parent = self._stack[-1] if self._stack else None
+                key = parent[3] if parent and parent[0] == "{" else None
+                self._stack.append([char, key, i, None])
+            elif char in "}]" and self._stack:
+                bracket, _, start, _ = self._stack.pop()
+                parent = self._stack[-1] if self._stack else None
+                if bracket == "{" and parent and parent[0] == "[" and parent[1] == self.array_key:
+                    try:
+                        items.append(_loads(text[start:i + 1]))
+                    except JSONParseError as exc:
+                        print(f"Skipping unparseable '{self.array_key}' item: {exc}")
+        self._position = len(text)
+        return items
@@ -0,0 +1,260 @@
+"""Single entry point for every OpenAI and Gemini call in the app.
+
+The gateway owns long-lived clients (one pooled AsyncOpenAI client per event
+loop, one configured Gemini SDK with cached GenerativeModel objects) and puts
+per-provider concurrency limits, token-bucket rate limits, timeouts and
+retries with jittered exponential backoff in front of them.
+
+Providers are pluggable, so tests can swap in a FakeProvider:
+
+    llm_gateway.set_provider("openai", FakeProvider("valid"))
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import weakref
+from types import SimpleNamespace
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_TIMEOUT = 60
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 10
+
+# Per-provider limits; override with e.g. OPENAI_MAX_CONCURRENCY / GEMINI_RATE_PER_SECOND
+DEFAULT_LIMITS = {
+    "openai": {"concurrency": 8, "rate_per_second": 5, "burst": 10},
+    "gemini": {"concurrency": 4, "rate_per_second": 2, "burst": 5},
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket. reserve() takes a token and returns how long to wait for it."""
+
+    def __init__(self, rate_per_second, burst):
+        self.rate = rate_per_second
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+
+class ProviderLimiter:
+    """Concurrency slots plus a token bucket, usable from threads and from coroutines."""
+
+    def __init__(self, concurrency, rate_per_second, burst):
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self._thread_slots = threading.BoundedSemaphore(concurrency)
+        # asyncio semaphores are bound to the loop they're first used on
+        self._loop_slots = weakref.WeakKeyDictionary()
+
+    def acquire(self):
+        self._thread_slots.acquire()
+        time.sleep(self.bucket.reserve())
+
+    def release(self):
+        self._thread_slots.release()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        slots = self._loop_slots.get(loop)
+        if slots is None:
+            slots = self._loop_slots[loop] = asyncio.Semaphore(self.concurrency)
+        await slots.acquire()
+        await asyncio.sleep(self.bucket.reserve())
+        return slots
+
+
+def _backoff(attempt):
+    # Full jitter keeps retries from many sessions from landing at the same moment
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class OpenAIProvider:
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        # httpx connection pools can't be shared between event loops
+        self._clients = weakref.WeakKeyDictionary()
+
+    def client(self):
+        from openai import AsyncOpenAI
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # Retries are handled by the gateway so they share its backoff and rate limits
+            client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"], timeout=self.timeout, max_retries=0)
+            self._clients[loop] = client
+        return client
+
+    async def chat_completion(self, **kwargs):
+        return await self.client().chat.completions.create(**kwargs)
+
+    def is_retryable(self, exc):
+        import openai
+
+        return isinstance(exc, (openai.RateLimitError, openai.APITimeoutError,
+                                openai.APIConnectionError, openai.InternalServerError))
+
+
+class GeminiProvider:
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._models = {}
+        self._configured = False
+        self._lock = threading.Lock()
+
+    def _genai(self):
+        import google.generativeai as genai
+
+        with self._lock:
+            if not self._configured:
+                genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+                self._configured = True
+        return genai
+
+    def model(self, model_name, generation_config=None):
+        key = (model_name, json.dumps(generation_config, sort_keys=True, default=str))
+        model = self._models.get(key)
+        if model is None:
+            model = self._genai().GenerativeModel(model_name=model_name, generation_config=generation_config)
+            self._models[key] = model
+        return model
+
+    def generate_content(self, model_name, contents, generation_config=None):
+        return self.model(model_name, generation_config).generate_content(
+            contents, request_options={"timeout": self.timeout}
+        )
+
+    def upload_file(self, path, display_name=None):
+        return self._genai().upload_file(path=path, display_name=display_name)
+
+    def is_retryable(self, exc):
+        from google.api_core import exceptions
+
+        return isinstance(exc, (exceptions.TooManyRequests, exceptions.ResourceExhausted,
+                                exceptions.ServiceUnavailable, exceptions.DeadlineExceeded,
+                                exceptions.InternalServerError))
+
+
+class FakeProvider:
+    """Stand-in for OpenAI or Gemini in tests.
+
+    `reply` is either a string or a callable taking the request kwargs and
+    returning a string. Every request is recorded in `calls`.
+    """
+
+    def __init__(self, reply=""):
+        self.reply = reply
+        self.calls = []
+
+    def _text(self, request):
+        self.calls.append(request)
+        return self.reply(request) if callable(self.reply) else self.reply
+
+    async def chat_completion(self, **kwargs):
+        text = self._text(kwargs)
+        if kwargs.get("stream"):
+            return self._stream(text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+    async def _stream(self, text):
+        for word in text.split(" "):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None))])
+
+    def generate_content(self, model_name, contents, generation_config=None):
+        return SimpleNamespace(text=self._text({"model": model_name, "contents": contents,
+                                                "generation_config": generation_config}))
+
+    def upload_file(self, path, display_name=None):
+        return SimpleNamespace(name=display_name or path, uri=path)
+
+    def is_retryable(self, exc):
+        return False
+
+
+class LLMGateway:
+    def __init__(self):
+        self.providers = {}
+        self.limiters = {}
+        self.set_provider("openai", OpenAIProvider())
+        self.set_provider("gemini", GeminiProvider())
+
+    def set_provider(self, name, provider):
+        limits = {
+            key: float(os.environ.get(f"{name.upper()}_{key.upper()}", value))
+            for key, value in DEFAULT_LIMITS[name].items()
+        }
+        self.providers[name] = provider
+        self.limiters[name] = ProviderLimiter(int(limits["concurrency"]), limits["rate_per_second"], limits["burst"])
+
+    async def _call_async(self, name, call):
+        provider, limiter = self.providers[name], self.limiters[name]
+        for attempt in range(MAX_RETRIES + 1):
+            slots = await limiter.acquire_async()
+            try:
+                return await asyncio.wait_for(call(provider), DEFAULT_TIMEOUT)
+            except Exception as exc:
+                retryable = isinstance(exc, asyncio.TimeoutError) or provider.is_retryable(exc)
+                if not retryable or attempt == MAX_RETRIES:
+                    raise
+                print(f"{name} call failed ({exc!r}), retrying")
+            finally:
+                slots.release()
+            await asyncio.sleep(_backoff(attempt))
+
+    def _call(self, name, call):
+        provider, limiter = self.providers[name], self.limiters[name]
+        for attempt in range(MAX_RETRIES + 1):
+            limiter.acquire()
+            try:
+                return call(provider)
+            except Exception as exc:
+                if not provider.is_retryable(exc) or attempt == MAX_RETRIES:
+                    raise
+                print(f"{name} call failed ({exc!r}), retrying")
+            finally:
+                limiter.release()
+            time.sleep(_backoff(attempt))
+
+    async def chat_completion(self, **kwargs):
+        """OpenAI chat completion; with stream=True the retries cover opening the stream."""
+        return await self._call_async("openai", lambda provider: provider.chat_completion(**kwargs))
+
+    def generate_content(self, model_name, contents, generation_config=None):
+        """Blocking Gemini generate_content."""
+        return self._call("gemini", lambda provider: provider.generate_content(model_name, contents, generation_config))
+
+    async def agenerate_content(self, model_name, contents, generation_config=None):
+        """Gemini generate_content run in a worker thread so the event loop stays free."""
+        return await asyncio.to_thread(self.generate_content, model_name, contents, generation_config)
+
+    def upload_file(self, path, display_name=None):
+        return self._call("gemini", lambda provider: provider.upload_file(path, display_name))
+
+
+gateway = LLMGateway()
+
+set_provider = gateway.set_provider
+chat_completion = gateway.chat_completion
+generate_content = gateway.generate_content
+agenerate_content = gateway.agenerate_content
+upload_file = gateway.upload_file
@@ -0,0 +1,207 @@
+import os
+import re
+import json
+import difflib
+import unicodedata
+
+# Local skill extraction: the survey's free-text skills answer is matched against a
+# bundled taxonomy of canonical skills, each with aliases in the languages our users
+# answer in. Matching is exact phrase matching over a token trie first, then fuzzy
+# matching for typos; whatever is still unmatched is left for the LLM.
+
+TAXONOMY_PATH = os.path.join(os.path.dirname(__file__), "skills_taxonomy.json")
+
+FUZZY_CUTOFF = 0.86
+# Words too short to fuzzy match without false positives ("art" vs "ar")
+FUZZY_MIN_LENGTH = 4
+MAX_FUZZY_NGRAM = 3
+# A segment whose only hits are single words covering less than this share of its
+# content words ("word of mouth marketing agency") is left for the LLM instead
+WEAK_MATCH_COVERAGE = 0.5
+
+TOKEN_RE = re.compile(r"[a-z0-9+#.']+")
+# Pieces this short around an apostrophe are elisions and contractions ("j'ai", "l'", "don't")
+ELISION_MAX_LENGTH = 2
+# Clauses in a list of skills: "cooking, cleaning and driving"
+SEGMENT_RE = re.compile(r"[,;/\n•|]+|\s(?:and|or|y|o|et|ou|e|&)\s")
+
+STOPWORDS = {
+    "i", "im", "am", "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "for", "with", "as",
+    "my", "me", "have", "has", "had", "know", "can", "do", "did", "good", "great", "very", "some",
+    "skills", "skill", "experience", "experienced", "years", "year", "work", "worked", "working",
+    "job", "jobs", "also", "like", "speak", "fluent", "basic", "advanced", "be", "is", "was", "it",
+    "yo", "tengo", "se", "de", "la", "el", "en", "con", "y", "o", "por", "para", "un", "una", "mi",
+    "experiencia", "trabajo", "anos", "habilidades", "hablo", "je", "le", "les", "des",
+    "et", "ou", "sais", "eu", "tenho", "e", "em", "com",
+}
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", (text or "").lower()).replace("\u2019", "'")
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def _split_apostrophes(token):
+    # "l'electricite" -> "electricite", "j'ai" -> nothing, "worker's" -> "worker"
+    if "'" not in token:
+        return [token]
+    return [piece for piece in token.split("'") if len(piece.strip(".")) > ELISION_MAX_LENGTH]
+
+
+def tokenize(text):
+    # Keep "+", "#" and "." inside tokens for C++, C#, .NET; strip sentence punctuation
+    pieces = (piece for token in TOKEN_RE.findall(normalize(text)) for piece in _split_apostrophes(token))
+    tokens = (token if token == ".net" else token.strip(".") for token in pieces)
+    return [token for token in tokens if token]
+
+
+class SkillTaxonomy:
+    """Canonical skills indexed for phrase matching (token trie) and fuzzy matching."""
+
+    def __init__(self, skills):
+        self.labels = {}
+        self.trie = {}
+        self.phrases = {}
+        for skill in skills:
+            self.labels[skill["id"]] = skill["label"]
+            for alias in [skill["label"], *skill.get("aliases", [])]:
+                tokens = tokenize(alias)
+                if not tokens:
+                    continue
+                node = self.trie
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                node[None] = skill["id"]
+                self.phrases[" ".join(tokens)] = skill["id"]
+        self.fuzzy_phrases = [phrase for phrase in self.phrases if len(phrase) >= FUZZY_MIN_LENGTH]
+
+    @classmethod
+    def load(cls, path=TAXONOMY_PATH):
+        with open(path, encoding="utf-8") as file:
+            return cls(json.load(file)["skills"])
+
+    def match_phrases(self, tokens):
+        """Longest-match scan over the trie. Returns [(start, end, skill_id)]."""
+        matches = []
+        start = 0
+        while start < len(tokens):
+            node = self.trie
+            best = None
+            for end in range(start, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                # A lone filler word is never a skill on its own
+                if None in node and (end > start or tokens[start] not in STOPWORDS):
+                    best = (start, end + 1, node[None])
+            if best:
+                matches.append(best)
+                start = best[1]
+            else:
+                start += 1
+        return matches
+
+    def match_fuzzy(self, tokens):
+        """Fuzzy match the longest n-grams first, e.g. "carpentery" -> carpentry."""
+        matches = []
+        covered = [False] * len(tokens)
+        for size in range(min(MAX_FUZZY_NGRAM, len(tokens)), 0, -1):
+            for start in range(len(tokens) - size + 1):
+                if any(covered[start:start + size]):
+                    continue
+                phrase = " ".join(tokens[start:start + size])
+                if len(phrase) < FUZZY_MIN_LENGTH or tokens[start] in STOPWORDS:
+                    continue
+                close = difflib.get_close_matches(phrase, self.fuzzy_phrases, n=1, cutoff=FUZZY_CUTOFF)
+                if close:
+                    matches.append((start, start + size, self.phrases[close[0]]))
+                    covered[start:start + size] = [True] * size
+        return sorted(matches)
+
+    def is_weak(self, tokens, matches):
+        """True if every match is a single word and together they cover little of the segment."""
+        if any(end - start > 1 for start, end, _ in matches):
+            return False
+        content = [token for token in tokens if token not in STOPWORDS]
+        return len(matches) < WEAK_MATCH_COVERAGE * len(content)
+
+    def extract(self, text):
+        """Return (skill_ids, unmatched_segments) for a free-text skills answer.
+
+        skill_ids are canonical taxonomy ids in order of first mention.
+        unmatched_segments are the clauses in which no skill was recognised
+        and that aren't just filler words.
+        """
+        skill_ids = []
+        unmatched = []
+        for segment in SEGMENT_RE.split(normalize(text)):
+            tokens = tokenize(segment)
+            if not tokens:
+                continue
+            matches = self.match_phrases(tokens) or self.match_fuzzy(tokens)
+            if matches and self.is_weak(tokens, matches):
+                matches = []
+            if not matches and any(token not in STOPWORDS for token in tokens):
+                unmatched.append(segment.strip())
+            for _, _, skill_id in matches:
+                if skill_id not in skill_ids:
+                    skill_ids.append(skill_id)
+        return skill_ids, unmatched
+
+    def canonical_id(self, skill):
+        """Map a single skill name (e.g. an LLM-extracted one) to its taxonomy id, or None."""
+        tokens = tokenize(skill)
+        phrase = " ".join(tokens)
+        if phrase in self.phrases:
+            return self.phrases[phrase]
+        matches = self.match_phrases(tokens)
+        if len(matches) == 1 and matches[0][1] - matches[0][0] == len(tokens):
+            return matches[0][2]
+        close = difflib.get_close_matches(phrase, self.fuzzy_phrases, n=1, cutoff=FUZZY_CUTOFF)
+        return self.phrases[close[0]] if close else None
+
+    def mentioned_ids(self, skill):
+        """Taxonomy ids named anywhere in a skill name, e.g. "Proficiency in Python" -> ["python"]."""
+        tokens = tokenize(skill)
+        matches = self.match_phrases(tokens) or self.match_fuzzy(tokens)
+        return list(dict.fromkeys(skill_id for _, _, skill_id in matches))
+
+    def label(self, skill_id):
+        return self.labels.get(skill_id, skill_id)
+
+
+_taxonomy = None
+
+
+def get_taxonomy():
+    global _taxonomy
+    if _taxonomy is None:
+        _taxonomy = SkillTaxonomy.load()
+    return _taxonomy
+
+
+def extract_skills(text):
+    return get_taxonomy().extract(text)
+
+
+def skill_label(skill_id):
+    return get_taxonomy().label(skill_id)
+
+
+def canonical_skill(skill):
+    """Return (key, label) for a skill name: the taxonomy id and label, or normalized text for unknown skills."""
+    skill_id = get_taxonomy().canonical_id(skill)
+    if skill_id:
+        return skill_id, skill_label(skill_id)
+    return " ".join(tokenize(skill)), " ".join(skill.split())
+
+
+def skill_keys(skill):
+    """Keys for matching a skill name against others: the taxonomy ids it mentions, else its canonical key."""
+    return get_taxonomy().mentioned_ids(skill) or [canonical_skill(skill)[0]]
+
+
+def canonical_skill_ids(skills):
+    """Stable, sorted keys for a list of skill names, for caching job and career lookups."""
+    keys = {canonical_skill(skill)[0] for skill in skills if skill and skill.strip()}
+    return sorted(key for key in keys if key)
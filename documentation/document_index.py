@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import math
+import mmap
+import threading
+from array import array
+from collections import Counter, defaultdict
+
+from documentation.form_catalog import DOCUMENTS_DIR, get_catalog
+
+INDEX_DIR = os.path.join(DOCUMENTS_DIR, ".index")
+
+# Chunks are windows of words with a small overlap so an answer that straddles
+# a chunk boundary is still retrievable from one of the two chunks.
+CHUNK_WORDS = 180
+CHUNK_OVERLAP = 40
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "if", "in",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "were",
+    "will", "with", "you", "your", "we", "our", "may", "must", "not", "do",
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_page(text, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    words = text.split()
+    if not words:
+        return []
+    step = max(chunk_words - overlap, 1)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+def _source_hashes(catalog):
+    return {entry["file"]: entry["content_hash"] for entry in catalog.all_entries()}
+
+
+def build_index(catalog=None, index_dir=INDEX_DIR):
+    """Chunk and index the cached page text of every PDF in the form catalog.
+
+    The index is written as three files:
+      - chunks.json: the chunk text with its source document and page number
+      - lexicon.json: term -> [offset, length] into postings.bin, plus corpus stats
+      - postings.bin: flat uint32 (chunk_id, term_frequency) pairs, memory-mapped at query time
+    """
+    catalog = catalog or get_catalog()
+    sources = _source_hashes(catalog)
+    chunks = []
+    postings = defaultdict(list)
+
+    for entry in catalog.all_entries():
+        file = entry["file"]
+        for page_number, page_text in enumerate(entry["pages"], 1):
+            for chunk_text in chunk_page(page_text):
+                tokens = tokenize(chunk_text)
+                if not tokens:
+                    continue
+                chunk_id = len(chunks)
+                chunks.append({"doc": file, "page": page_number, "text": chunk_text, "length": len(tokens)})
+                for term, tf in Counter(tokens).items():
+                    postings[term].append((chunk_id, tf))
+
+    os.makedirs(index_dir, exist_ok=True)
+    flat = array("I")
+    lexicon = {}
+    for term in sorted(postings):
+        lexicon[term] = [len(flat) // 2, len(postings[term])]
+        for chunk_id, tf in postings[term]:
+            flat.append(chunk_id)
+            flat.append(tf)
+
+    with open(os.path.join(index_dir, "postings.bin"), "wb") as file:
+        flat.tofile(file)
+    with open(os.path.join(index_dir, "chunks.json"), "w") as file:
+        json.dump(chunks, file)
+    with open(os.path.join(index_dir, "lexicon.json"), "w") as file:
+        json.dump({
+            "sources": sources,
+            "num_chunks": len(chunks),
+            "avg_length": sum(chunk["length"] for chunk in chunks) / max(len(chunks), 1),
+            "terms": lexicon,
+        }, file)
+
+    print(f"Indexed {len(chunks)} chunks from {len(sources)} documents into {index_dir}")
+
+
+class DocumentIndex:
+    """Read-only BM25 index over the chunks written by build_index."""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        with open(os.path.join(index_dir, "lexicon.json")) as file:
+            lexicon = json.load(file)
+        with open(os.path.join(index_dir, "chunks.json")) as file:
+            self.chunks = json.load(file)
+
+        self.sources = lexicon["sources"]
+        self.terms = lexicon["terms"]
+        self.num_chunks = lexicon["num_chunks"]
+        self.avg_length = lexicon["avg_length"] or 1.0
+
+        self._file = open(os.path.join(index_dir, "postings.bin"), "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._postings = memoryview(self._mmap).cast("I")
+        else:
+            self._mmap = None
+            self._postings = memoryview(array("I"))
+
+    def search(self, query, k=5, doc=None):
+        """Return the k best chunks for query, optionally restricted to one document."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            idf = math.log(1 + (self.num_chunks - df + 0.5) / (df + 0.5))
+            pairs = self._postings[offset * 2:(offset + df) * 2]
+            for i in range(0, len(pairs), 2):
+                chunk_id, tf = pairs[i], pairs[i + 1]
+                chunk = self.chunks[chunk_id]
+                if doc is not None and chunk["doc"] != doc:
+                    continue
+                norm = K1 * (1 - B + B * chunk["length"] / self.avg_length)
+                scores[chunk_id] += idf * tf * (K1 + 1) / (tf + norm)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [dict(self.chunks[chunk_id], score=score) for chunk_id, score in best]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(index_dir=INDEX_DIR):
+    """Load the on-disk index, rebuilding it first if it is missing or out of date."""
+    global _index
+    catalog = get_catalog()
+    with _index_lock:
+        if _index is None or _index.sources != _source_hashes(catalog):
+            try:
+                index = DocumentIndex(index_dir)
+                if index.sources != _source_hashes(catalog):
+                    raise FileNotFoundError
+            except (FileNotFoundError, KeyError, json.JSONDecodeError):
+                build_index(catalog, index_dir)
+                index = DocumentIndex(index_dir)
+            _index = index
+        return _index
+
+
+if __name__ == "__main__":
+    # Build the index offline: python -m documentation.document_index
+    build_index()
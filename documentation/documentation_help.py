@@ -1,15 +1,70 @@
 import reflex as rx
 import os
+import asyncio
 import json
-import google.generativeai as genai
 from dotenv import load_dotenv
-import PyPDF2
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 import re
+from common import llm_gateway
+from common.cache import PersistentCache
+from common.json_utils import parse_json
+from documentation.document_index import get_index
+from documentation.form_catalog import DOCUMENTS_DIR, get_catalog
 
 load_dotenv()
 
+# Number of instruction chunks sent to the model per question
+RETRIEVAL_TOP_K = 6
+
+# Bump whenever the immigration info prompt changes so old answers aren't served
+IMMIGRATION_INFO_PROMPT_VERSION = "v2"
+
+IMMIGRATION_INFO_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "current_status": {"type": "string"},
+        "next_steps": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"step": {"type": "string"}, "description": {"type": "string"}},
+                "required": ["step", "description"],
+            },
+        },
+        "required_documents_to_fill": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"document": {"type": "string"}, "description": {"type": "string"}},
+                "required": ["document", "description"],
+            },
+        },
+        "required_documents_download_link": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"document": {"type": "string"}, "link": {"type": "string"}},
+                "required": ["document", "link"],
+            },
+        },
+        "additional_info": {"type": "string"},
+    },
+    "required": ["current_status", "next_steps", "required_documents_to_fill", "additional_info"],
+}
+
+# Shared by every session and persisted across restarts
+immigration_info_cache = PersistentCache("immigration_info", ttl=7 * 24 * 3600, stale_ttl=30 * 24 * 3600)
+
+# Build (or load) the form catalog once at startup rather than on the first submit
+get_catalog()
+
+
+def normalize_status(status):
+    """Normalize an immigration status for use as a cache key, e.g. " H-1B  Visa" -> "h-1b visa"."""
+    status = re.sub(r"[^\w\s-]", "", status.lower())
+    return " ".join(status.split())
+
 
 class State(rx.State):
     immigration_status: str = ""
@@ -23,72 +78,82 @@ class State(rx.State):
 
     def get_formatted_immigration_info(self, immigration_info_json):
         if not immigration_info_json:
-            return "No immigration information available."
-        
-        info = immigration_info_json
-        self.current_status = f"Current Status: {info['current_status']}\n\n"
-        print(info["required_documents_to_fill"])
-        for step in info['next_steps']:
-            self.next_steps.append(f"- {step['step']}: {step['description']}\n")
-        try:
-            for key in info['required_documents_to_fill']:
-                self.required_documents.append(f"- {key}: {info['required_documents_to_fill'][key]}\n")
-        except:
-            self.required_documents = ["No required documents found."]
+            return {"current_status": "No immigration information available.", "next_steps": [], "required_documents": [], "additional_info": ""}
 
-        self.additional_info += f"\nAdditional Information: {info['additional_info']}"
+        info = immigration_info_json
+        formatted = {
+            "current_status": f"Current Status: {info['current_status']}\n\n",
+            "next_steps": [f"- {step['step']}: {step['description']}\n" for step in info['next_steps']],
+            "additional_info": f"\nAdditional Information: {info['additional_info']}",
+        }
+        formatted["required_documents"] = [
+            f"- {doc['document']}: {doc['description']}\n" for doc in info.get('required_documents_to_fill', [])
+        ] or ["No required documents found."]
+        return formatted
 
-    def get_immigration_info(self, status):
-        # Configure Gemini
+    @rx.background
+    async def get_immigration_info(self, status):
         print("Immigration for Documentation", status)
-        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+        # Show a placeholder right away; the model call below runs without holding the state lock
+        async with self:
+            self.current_status = "Loading your immigration information..."
+            self.next_steps = []
+            self.required_documents = []
+            self.additional_info = ""
 
+        try:
+            info = await immigration_info_cache.aget_or_compute(
+                f"{IMMIGRATION_INFO_PROMPT_VERSION}:{normalize_status(status)}",
+                lambda: self.fetch_immigration_info(status),
+            )
+        except Exception as exc:
+            print(f"Error fetching immigration info: {exc}")
+            async with self:
+                self.current_status = "We couldn't load your immigration information. Please refresh the page to try again."
+            return
+
+        formatted = self.get_formatted_immigration_info(info)
+        async with self:
+            self.immigration_info = json.dumps(info)
+            self.current_status = formatted["current_status"]
+            self.next_steps = formatted["next_steps"]
+            self.required_documents = formatted["required_documents"]
+            self.additional_info = formatted["additional_info"]
+
+    async def fetch_immigration_info(self, status):
         # Create the model
         generation_config = {
             "temperature": 0.7,
             "top_p": 0.95,
             "top_k": 40,
             "max_output_tokens": 8192,
+            "response_mime_type": "application/json",
+            "response_schema": IMMIGRATION_INFO_SCHEMA,
         }
 
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-pro-002",
-            generation_config=generation_config,
-        )
-
         prompt = f"""
             Given the immigration status {status}, provide a detailed, step-by-step guide on the next steps in the immigration process or the required documentation.
-        Format the response as a JSON string (without comments) with the following structure:
+        Respond with a JSON object with the following structure:
         {{
         "current_status": "Description of the current status",
         "next_steps": [
-        {{
-        "step": "Step 1",
-        "description": "Detailed description of step 1"
-        }},
-        {{
-        "step": "Step 2",
-        "description": "Detailed description of step 2"
-        }},
+        {{"step": "Step 1", "description": "Detailed description of step 1"}},
         ...
         ],
         "required_documents_to_fill": [
-        "Document 1 needed to maintain immigration status or continue through a permanent residency/citizenship": "Description of Document 1 and detailed instructions on how to access this document",
-        "Document 2 needed to maintain immigration status or continue through a permanent residency/citizenship ": "Description of Document 2 and detailed instructions on how to access this document",
+        {{"document": "Document needed to maintain immigration status or continue through a permanent residency/citizenship", "description": "Description of the document and detailed instructions on how to access this document"}},
         ...
         ],
         "required_documents_download_link": [
-        "Document 1": "Download Blank Document Link or Example Document Download Link",
-        "Document 2": "Download Blank Document Link or Example Document Download Link",
+        {{"document": "Document name", "link": "Download Blank Document Link or Example Document Download Link"}},
         ...
         ],
         "additional_info": "Any additional relevant information"
         }}
         """
 
-        response = model.generate_content(prompt)
-        self.immigration_info = response.text[7:-4]
-        self.get_formatted_immigration_info(json.loads(self.immigration_info))
+        response = await llm_gateway.agenerate_content("gemini-1.5-pro-002", prompt, generation_config)
+        return parse_json(response.text, IMMIGRATION_INFO_SCHEMA)
 
     def display_immigration_info(self, info):
         print(info)
@@ -107,40 +172,20 @@ class State(rx.State):
         # print(f"\nAdditional Information: {info['additional_info']}")
 
     def extract_form_code(self, input_pdf_path):
-        try:
-            with open(input_pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Extract text from the first page
-                first_page_content = pdf_reader.pages[0].extract_text()
-                
-                # Use regex to find the form type
-                form_match = re.search(r'Form\s+([A-Z]-\d+)', first_page_content)
-                if form_match:
-                    form_type = form_match.group(0)  # Full match (e.g., "Form I-90")
-                    form_code = form_match.group(1)  # Just the code (e.g., "I-90")
-                    # print(f"Form Type: {form_type}")
-                    # print(f"Form Code: {form_code}")
-                    return form_code
-                else:
-                    print("Form type not found in the document.")
-                    return None
-            
-        except FileNotFoundError:
-            print(f"Error: The file '{input_pdf_path}' was not found.")
-        except PyPDF2.errors.PdfReadError:
-            print(f"Error: '{input_pdf_path}' is not a valid PDF file or is encrypted.")
-        except Exception as e:
-            print(f"An unexpected error occurred: {str(e)}")
-        
-        return None
+        entry = get_catalog().get_entry(input_pdf_path)
+        if entry is None:
+            print(f"Error: The file '{input_pdf_path}' was not found in the form catalog.")
+            return None
+        return entry["form_code"]
 
     # Example usage
-    def help_with_document(self, instructions_pdf, form_code):
-        # Configure Gemini
-        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-        
-        sample_file = genai.upload_file(path=instructions_pdf, display_name=f"{form_code}_instructions")
+    async def help_with_document(self, instructions_pdf, form_code):
+        # Only the most relevant chunks of the instructions are sent instead of uploading the whole PDF
+        query = f"Form {form_code} purpose who may file general instructions filing fee where to file"
+        index = await asyncio.to_thread(get_index)
+        chunks = index.search(query, k=RETRIEVAL_TOP_K, doc=os.path.basename(instructions_pdf))
+        excerpts = "\n\n".join(f"[Page {chunk['page']}] {chunk['text']}" for chunk in chunks)
+
         generation_config = {
             "temperature": 0.7,
             "top_p": 0.95,
@@ -148,28 +193,33 @@ class State(rx.State):
             "max_output_tokens": 8192,
         }
 
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-pro-002",
-            generation_config=generation_config,
-        )
-        chat = model.start_chat(history=[])
-
         # Initial message to set the context
-        initial_prompt = f"You are an assistant helping with the instructions and questions for form {form_code}. The instructions have been uploaded as a PDF. Please provide a brief summary of the document."
-        response = chat.send_message([sample_file, initial_prompt])
-        self.chat_history += [(response.text, "")]
-
-
-    def answer(self):
-        file_out = ""
-        documents_dir = 'Documents'
-        for file in os.listdir(documents_dir):
-            file_path = os.path.join(documents_dir, file)
-            if file.endswith('.pdf') and self.form_code.lower() in file:
-                file_out = file
-                break
-        try:
-            instructions_pdf = os.path.join(documents_dir, file_out)
-            self.help_with_document(instructions_pdf, self.form_code)
-        except:
-            pass
\ No newline at end of file
+        initial_prompt = f"""You are an assistant helping with the instructions and questions for form {form_code}. Below are the most relevant excerpts of the official instructions, each tagged with its page number.
+        Please provide a brief summary of the document. Cite the page numbers you relied on.
+
+        Excerpts:
+        {excerpts}"""
+        response = await llm_gateway.agenerate_content("gemini-1.5-pro-002", initial_prompt, generation_config)
+        return response.text
+
+    @rx.background
+    async def answer(self):
+        async with self:
+            form_code = self.form_code
+            self.chat_history += [(f"Looking up the instructions for form {form_code}...", "")]
+            placeholder_index = len(self.chat_history) - 1
+
+        # The catalog may rescan new PDFs in a process pool, so keep it off the event loop
+        entry = await asyncio.to_thread(get_catalog().lookup, form_code)
+        if entry is None:
+            reply = f"No instructions were found for form {form_code}. Please check the form code and try again."
+        else:
+            try:
+                instructions_pdf = os.path.join(DOCUMENTS_DIR, entry["file"])
+                reply = await self.help_with_document(instructions_pdf, entry["form_code"])
+            except Exception as exc:
+                print(f"Error answering for form {form_code}: {exc}")
+                reply = "Sorry, something went wrong while reading the instructions. Please try again."
+
+        async with self:
+            self.chat_history[placeholder_index] = (reply, "")
@@ -0,0 +1,155 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+DOCUMENTS_DIR = "Documents"
+CATALOG_PATH = os.path.join(DOCUMENTS_DIR, ".index", "catalog.json")
+
+# Even without a directory change, file mtimes are re-checked at most this often
+# so an instructions PDF replaced in place is picked up too.
+FULL_CHECK_INTERVAL = 30
+
+FORM_CODE_RE = re.compile(r"Form\s+([A-Z]-\d+[A-Z]?)\b")
+FILENAME_CODE_RE = re.compile(r"^([a-z])-?(\d+)([a-z]?)instr", re.IGNORECASE)
+
+
+def normalize_form_code(code):
+    """Normalize a user-typed form code, e.g. "Form I-129F", "i129f" -> "i129f"."""
+    code = re.sub(r"^\s*form\s+", "", code.lower())
+    return re.sub(r"[^a-z0-9]", "", code)
+
+
+def form_code_from_filename(file):
+    match = FILENAME_CODE_RE.match(file)
+    if not match:
+        return None
+    letter, number, suffix = match.groups()
+    return f"{letter.upper()}-{number}{suffix.upper()}"
+
+
+def scan_pdf(pdf_path):
+    """Read one PDF and return its catalog entry. Runs in a worker process."""
+    file = os.path.basename(pdf_path)
+    with open(pdf_path, "rb") as handle:
+        content = handle.read()
+    try:
+        with open(pdf_path, "rb") as handle:
+            pdf_reader = PyPDF2.PdfReader(handle)
+            pages = [page.extract_text() or "" for page in pdf_reader.pages]
+    except PyPDF2.errors.PdfReadError:
+        print(f"Error: '{pdf_path}' is not a valid PDF file or is encrypted.")
+        return None
+
+    filename_code = form_code_from_filename(file)
+    form_match = FORM_CODE_RE.search(pages[0]) if pages else None
+    form_code = filename_code or (form_match.group(1) if form_match else os.path.splitext(file)[0])
+
+    aliases = {normalize_form_code(form_code), normalize_form_code(os.path.splitext(file)[0])}
+    if form_match and not filename_code:
+        aliases.add(normalize_form_code(form_match.group(1)))
+
+    return {
+        "file": file,
+        "form_code": form_code,
+        "aliases": sorted(aliases),
+        "page_count": len(pages),
+        "content_hash": hashlib.sha256(content).hexdigest(),
+        "mtime": os.path.getmtime(pdf_path),
+        "pages": pages,
+    }
+
+
+class FormCatalog:
+    """Form code -> instructions PDF catalog with cached per-page text.
+
+    Entries are persisted to CATALOG_PATH and only rescanned when a file's mtime
+    changes. Lookups go through an alias dict so they are O(1).
+    """
+
+    def __init__(self, documents_dir=DOCUMENTS_DIR, catalog_path=CATALOG_PATH):
+        self.documents_dir = documents_dir
+        self.catalog_path = catalog_path
+        self.entries = {}
+        self.aliases = {}
+        self._dir_mtime = None
+        self._last_full_check = 0
+        self._lock = threading.Lock()
+        self._load()
+        self.refresh()
+
+    def _load(self):
+        try:
+            with open(self.catalog_path) as file:
+                self.entries = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.catalog_path), exist_ok=True)
+        tmp_path = self.catalog_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.entries, file)
+        os.replace(tmp_path, self.catalog_path)
+
+    def refresh(self):
+        """Rescan new or modified PDFs in a process pool and drop deleted ones."""
+        with self._lock:
+            self._dir_mtime = os.path.getmtime(self.documents_dir)
+            self._last_full_check = time.monotonic()
+            mtimes = {
+                file: os.path.getmtime(os.path.join(self.documents_dir, file))
+                for file in os.listdir(self.documents_dir)
+                if file.endswith(".pdf")
+            }
+            stale = [file for file, mtime in mtimes.items()
+                     if file not in self.entries or self.entries[file]["mtime"] != mtime]
+            removed = [file for file in self.entries if file not in mtimes]
+
+            if stale:
+                paths = [os.path.join(self.documents_dir, file) for file in stale]
+                with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as pool:
+                    for entry in pool.map(scan_pdf, paths):
+                        if entry is not None:
+                            self.entries[entry["file"]] = entry
+            for file in removed:
+                del self.entries[file]
+
+            if stale or removed:
+                self._save()
+            self.aliases = {alias: entry for entry in self.entries.values() for alias in entry["aliases"]}
+
+    def _refresh_if_changed(self):
+        if (os.path.getmtime(self.documents_dir) != self._dir_mtime
+                or time.monotonic() - self._last_full_check > FULL_CHECK_INTERVAL):
+            self.refresh()
+
+    def lookup(self, form_code):
+        """Return the catalog entry for a form code or alias, or None."""
+        self._refresh_if_changed()
+        return self.aliases.get(normalize_form_code(form_code))
+
+    def get_entry(self, file):
+        self._refresh_if_changed()
+        return self.entries.get(os.path.basename(file))
+
+    def all_entries(self):
+        self._refresh_if_changed()
+        return [self.entries[file] for file in sorted(self.entries)]
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = FormCatalog()
+        return _catalog
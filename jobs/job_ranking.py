@@ -0,0 +1,65 @@
+import re
+import numpy as np
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Titles say more about a posting than boilerplate-heavy descriptions
+TITLE_WEIGHT = 3
+
+# Postings sent to Gemini for the final ranking, and the per-posting description budget
+TOP_K = 12
+DESCRIPTION_TOKEN_BUDGET = 120
+# Rough English average, good enough for budgeting prompt size
+TOKENS_PER_WORD = 4 / 3
+
+TOKEN_RE = re.compile(r"[a-z0-9+#]+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def profile_terms(skills, education):
+    return sorted(set(tokenize(" ".join(skills))) | set(tokenize(education)))
+
+
+def score_jobs(jobs, skills, education):
+    """BM25 score of every posting's title and description against the profile, in one vectorized pass."""
+    terms = profile_terms(skills, education)
+    if not jobs or not terms:
+        return np.zeros(len(jobs))
+    term_index = {term: i for i, term in enumerate(terms)}
+
+    # jobs x profile-terms term-frequency matrix; terms outside the profile only count towards length
+    tf = np.zeros((len(jobs), len(terms)))
+    lengths = np.zeros(len(jobs))
+    for row, job in enumerate(jobs):
+        tokens = tokenize(job.get("positionName")) * TITLE_WEIGHT + tokenize(job.get("description"))
+        lengths[row] = len(tokens)
+        for token in tokens:
+            column = term_index.get(token)
+            if column is not None:
+                tf[row, column] += 1
+
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log(1 + (len(jobs) - df + 0.5) / (df + 0.5))
+    norm = K1 * (1 - B + B * lengths / max(lengths.mean(), 1))
+    return (idf * tf * (K1 + 1) / (tf + norm[:, None])).sum(axis=1)
+
+
+def prerank_jobs(jobs, skills, education, top_k=TOP_K):
+    """Return the top_k postings by local score, best first."""
+    scores = score_jobs(jobs, skills, education)
+    # Stable sort keeps Indeed's own order among ties
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return [jobs[i] for i in order]
+
+
+def truncate_description(text, token_budget=DESCRIPTION_TOKEN_BUDGET):
+    words = (text or "").split()
+    max_words = int(token_budget / TOKENS_PER_WORD)
+    if len(words) <= max_words:
+        return " ".join(words)
+    return " ".join(words[:max_words]) + "..."
@@ -1,37 +1,179 @@
 import os
+import asyncio
+import contextlib
 import reflex as rx
-import google.generativeai as genai
-from apify_client import ApifyClient
+from apify_client import ApifyClient, ApifyClientAsync
 import warnings
 warnings.filterwarnings("ignore")
 import json
 from dotenv import load_dotenv
+from common import llm_gateway
+from common.cache import PersistentCache
+from common.json_utils import parse_json
+from common.skills import canonical_skill_ids
+from jobs.job_ranking import prerank_jobs, truncate_description
 load_dotenv()
 
 # Initialize the ApifyClient with your API token
 client = ApifyClient(os.environ["APIFY_API_KEY"])
-
-# Configure Gemini
-genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+async_client = ApifyClientAsync(os.environ["APIFY_API_KEY"])
+
+INDEED_ACTOR = "misceres/indeed-scraper"
+MAX_ITEMS = 20
+# Seconds between polls of the actor's dataset while the run is in progress
+POLL_INTERVAL = 2
+# Rank as soon as this many postings have arrived instead of waiting for the whole run
+RANK_MIN_ITEMS = 15
+TERMINAL_RUN_STATUSES = {"SUCCEEDED", "FAILED", "ABORTED", "TIMED-OUT"}
+
+# Skip the Gemini ranking call entirely and return the local top 10
+JOBS_LOCAL_ONLY = os.environ.get("JOBS_LOCAL_ONLY", "").lower() in ("1", "true", "yes")
+
+RANKED_JOB_IDS_SCHEMA = {"type": "array", "items": {"type": "integer"}}
+
+# Shared across sessions and restarts. Raw scrapes and ranked output are stored separately
+# so a new education/status combination can re-rank an existing scrape without a new Apify run.
+# Empty scrapes and rankings aren't cached so a search that found nothing is retried next time.
+JOB_CACHE_TTL = int(os.environ.get("JOB_CACHE_TTL", 6 * 3600))
+JOB_CACHE_STALE_TTL = int(os.environ.get("JOB_CACHE_STALE_TTL", 3 * 24 * 3600))
+scrape_cache = PersistentCache("job_scrape", ttl=JOB_CACHE_TTL, stale_ttl=JOB_CACHE_STALE_TTL, cache_empty=False)
+ranking_cache = PersistentCache("job_ranking", ttl=JOB_CACHE_TTL, stale_ttl=JOB_CACHE_STALE_TTL, cache_empty=False)
+
+
+def indeed_run_input(skills, zipcode):
+    # Join skills into a query string for the position
+    skill_query = " OR ".join(skills)
+    return {
+        "country": "US",
+        "location": zipcode,
+        "position": skill_query,
+        "maxItems": MAX_ITEMS,
+        "includeUnfilteredResults": True
+    }
+
+
+async def stream_indeed_jobs(skills, zipcode):
+    """Start the Indeed actor and yield batches of postings as they land in its dataset."""
+    run = await async_client.actor(INDEED_ACTOR).start(run_input=indeed_run_input(skills, zipcode))
+    run_client = async_client.run(run["id"])
+    dataset = async_client.dataset(run["defaultDatasetId"])
+    offset = 0
+    try:
+        while True:
+            finished = run["status"] in TERMINAL_RUN_STATUSES
+            page = await dataset.list_items(offset=offset)
+            if page.items:
+                offset += len(page.items)
+                yield page.items
+            if finished:
+                return
+            await asyncio.sleep(POLL_INTERVAL)
+            run = await run_client.get()
+    finally:
+        # Stop paying for the actor if the consumer has already got what it needs
+        if run["status"] not in TERMINAL_RUN_STATUSES:
+            await run_client.abort()
+
+
+def format_job_line(job):
+    return (f"Job Title: {job.get('positionName', 'N/A')}, Salary: {job.get('salary') or 'N/A'}, "
+            f"Company: {job.get('company', 'N/A')}, Location: {job.get('location', 'N/A')}, URL: {job.get('url', 'N/A')}")
+
+
+def format_jobs_for_gemini(recommended_jobs):
+    job_strings = []
+    for job_id, job in enumerate(recommended_jobs):
+        job_string = json.dumps({
+            'id': job_id,
+            'positionName': job.get('positionName', 'N/A'),
+            'salary': job.get('salary', 'N/A'),
+            'description': truncate_description(job.get('description')) or 'N/A',
+            'company': job.get('company', 'N/A'),
+            'location': job.get('location', 'N/A'),
+            'url': job.get('url', 'N/A')
+        })
+        job_strings.append(job_string)
+    return '#######'.join(job_strings)
+
+
+async def get_gemini_recommendations(formatted_job_string, education, immigration_status):
+    # Create the model
+    generation_config = {
+        "temperature": 1,
+        "top_p": 0.95,
+        "top_k": 40,
+        "max_output_tokens": 1024,
+        "response_mime_type": "application/json",
+        "response_schema": RANKED_JOB_IDS_SCHEMA,
+    }
+
+    prompt = f"""The following is an aggregation JSON file of all potential jobs for an applicant. Each job is sepaarated by '#######' and has an 'id'.
+    The applicant's education is {education} and their current immigration status is {immigration_status}. 
+    Out of these jobs find the top 10 jobs that are the most preferable for the given candidate given the education level and immigration status above. 
+    Respond with a JSON array of the chosen job ids, most preferable first.
+
+    Jobs: {formatted_job_string}"""
+
+    response = await llm_gateway.agenerate_content("gemini-1.5-flash-002", prompt, generation_config)
+    return parse_json(response.text, RANKED_JOB_IDS_SCHEMA)
+
+
+async def rank_jobs(scraped_jobs, skills, education, immigration_status):
+    # Score locally first so only the most relevant postings, trimmed, reach the prompt
+    top_jobs = prerank_jobs(scraped_jobs, skills, education)
+    if JOBS_LOCAL_ONLY:
+        return [format_job_line(job) for job in top_jobs[:10]]
+    formatted_job_string = format_jobs_for_gemini(top_jobs)
+    job_ids = await get_gemini_recommendations(formatted_job_string, education, immigration_status)
+    print("Recommended job ids:", job_ids)
+    # Postings are formatted locally, so the model can't garble URLs or invent jobs
+    job_ids = list(dict.fromkeys(job_id for job_id in job_ids if 0 <= job_id < len(top_jobs)))
+    if not job_ids:
+        # Nothing usable from the model; fall back to the local ranking
+        return [format_job_line(job) for job in top_jobs[:10]]
+    return [format_job_line(top_jobs[job_id]) for job_id in job_ids[:10]]
+
+
+async def collect_indeed_jobs(skills, zipcode):
+    scraped_jobs = []
+    async with contextlib.aclosing(stream_indeed_jobs(skills, zipcode)) as batches:
+        async for batch in batches:
+            scraped_jobs.extend(batch)
+            if len(scraped_jobs) >= RANK_MIN_ITEMS:
+                break
+    return scraped_jobs
+
+
+def job_search_key(skills, zipcode):
+    """Cache key for a search: the sorted canonical skill ids plus the location."""
+    return f"{'|'.join(canonical_skill_ids(skills))}@{zipcode.strip()}"
+
+
+def job_ranking_key(skills, zipcode, education, immigration_status):
+    profile = "|".join(" ".join(field.lower().split()) for field in (education, immigration_status))
+    mode = "local" if JOBS_LOCAL_ONLY else "gemini"
+    return f"{job_search_key(skills, zipcode)}#{profile}#{mode}"
+
+
+async def refresh_job_search(skills, zipcode, education, immigration_status):
+    """Re-scrape and re-rank a search, updating both caches. Used for background revalidation."""
+    scraped_jobs = await collect_indeed_jobs(skills, zipcode)
+    scrape_cache.set(job_search_key(skills, zipcode), scraped_jobs)
+    return await rank_jobs(scraped_jobs, skills, education, immigration_status)
 
 
 class State(rx.State):
-    job_results: str = ""
+    job_results: list[str] = []
+    job_status: str = ""
+    job_search_running: bool = False
+
     def run_indeed_scraper(self, skills, zipcode):
-        # Join skills into a query string for the position
-        skill_query = " OR ".join(skills)
         # Prepare the run input
-        run_input = {
-            "country": "US",
-            "location": zipcode,
-            "position": skill_query,
-            "maxItems": 20,
-            "includeUnfilteredResults": True
-        }
-        
+        run_input = indeed_run_input(skills, zipcode)
+
         # Run the Indeed scraper
         print(run_input)
-        run = client.actor("misceres/indeed-scraper").call(run_input=run_input)
+        run = client.actor(INDEED_ACTOR).call(run_input=run_input)
         # Fetch job postings from the default dataset
         recommended_jobs = []
         for item in client.dataset(run["defaultDatasetId"]).iterate_items():
@@ -40,67 +182,65 @@ class State(rx.State):
         
         return recommended_jobs
 
-    def format_jobs_for_gemini(self, recommended_jobs):
-        job_strings = []
-        for job in recommended_jobs:
-            job_string = json.dumps({
-                'positionName': job.get('positionName', 'N/A'),
-                'salary': job.get('salary', 'N/A'),
-                'description': job.get('description', 'N/A'),
-                'company': job.get('company', 'N/A'),
-                'location': job.get('location', 'N/A'),
-                'url': job.get('url', 'N/A')
-            })
-            job_strings.append(job_string)
-        return '#######'.join(job_strings)
-
-    def get_gemini_recommendations(self, formatted_job_string, education, immigration_status):
-        # Create the model
-        generation_config = {
-            "temperature": 1,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 8192,
-            "response_mime_type": "text/plain",
-        }
-
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash-002",
-            generation_config=generation_config,
-        )
-
-        chat_session = model.start_chat(history=[])
-
-        prompt = f"""The following is an aggregation JSON file of all potential jobs for an applicant. Each job is sepaarated by '#######'.
-        The applicant's education is {education} and their current immigration status is {immigration_status}. 
-        Out of these jobs find the top 10 jobs that are the most preferable for the given candidate given the education level and immigration status above. 
-        For each chosen job, make sure the jobs are outputted in a nice bulleted paragraph, not bolded format with the following job title ('Job Title'), the salary ('Salary'), the company ('Company'), the location ('Location'), and the job URL ('URL'). 
-        Put two '\n' after every job to create two new lines for every job recommendation and remove any '*' from response (right after the job url). Don't include any other extra information in the output. 
-
-        Jobs: {formatted_job_string}"""
-
-        response = chat_session.send_message(prompt)
-        return response.text
-
-    def get_job_postings(self, skills, zipcode, education, immigration_status):
-        if self.job_results != "":
-            return
+    @rx.background
+    async def get_job_postings(self, skills, zipcode, education, immigration_status):
+        async with self:
+            if self.job_results or self.job_search_running:
+                return
+            self.job_search_running = True
+            self.job_status = "Searching for jobs near you..."
         print("Skills", skills)
         print("Zipcode", zipcode)
         print("Education", education)
         print("Immigration", immigration_status)
-        scraped_jobs = self.run_indeed_scraper(skills, zipcode)
-        formatted_job_string = self.format_jobs_for_gemini(scraped_jobs)
-        recommended_jobs = self.get_gemini_recommendations(formatted_job_string, education, immigration_status)
-        # return recommended_jobs
-        print("Recommended jobs:", recommended_jobs)
-        new_recommended_jobs = []
-        for job in recommended_jobs.split("\n"):
-            if job:
-                new_recommended_jobs.append(job)
-        self.job_results = new_recommended_jobs
-        
-
-
-
 
+        try:
+            ranking_key = job_ranking_key(skills, zipcode, education, immigration_status)
+
+            # Ranked results for this exact search; stale entries are served while a refresh runs
+            if ranking_cache.get(ranking_key) is not None:
+                recommended_jobs = await ranking_cache.aget_or_compute(
+                    ranking_key, lambda: refresh_job_search(skills, zipcode, education, immigration_status)
+                )
+                async with self:
+                    self.job_results = recommended_jobs
+                    self.job_status = ""
+                return
+
+            search_key = job_search_key(skills, zipcode)
+            if scrape_cache.get(search_key) is not None:
+                scraped_jobs = await scrape_cache.aget_or_compute(search_key, lambda: collect_indeed_jobs(skills, zipcode))
+            else:
+                async def stream_scrape():
+                    scraped_jobs = []
+                    # Show postings as soon as they arrive; ranking starts once enough are in
+                    async with contextlib.aclosing(stream_indeed_jobs(skills, zipcode)) as batches:
+                        async for batch in batches:
+                            scraped_jobs.extend(batch)
+                            async with self:
+                                self.job_results = [format_job_line(job) for job in scraped_jobs]
+                            if len(scraped_jobs) >= RANK_MIN_ITEMS:
+                                break
+                    return scraped_jobs
+
+                # Identical searches already in flight wait for that run instead of starting their own
+                scraped_jobs = await scrape_cache.aget_or_compute(search_key, stream_scrape)
+            async with self:
+                self.job_results = [format_job_line(job) for job in scraped_jobs]
+
+            async with self:
+                self.job_status = "Finding the best matches for you..." if scraped_jobs else "No job postings found near you."
+            if scraped_jobs:
+                recommended_jobs = await ranking_cache.aget_or_compute(
+                    ranking_key, lambda: rank_jobs(scraped_jobs, skills, education, immigration_status)
+                )
+                async with self:
+                    self.job_results = recommended_jobs
+                    self.job_status = ""
+        except Exception as exc:
+            print(f"Error fetching job postings: {exc}")
+            async with self:
+                self.job_status = "We couldn't load job postings right now. Please try again later."
+        finally:
+            async with self:
+                self.job_search_running = False
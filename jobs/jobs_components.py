@@ -6,6 +6,10 @@ from chatapp import style
 def jobs() -> rx.Component:
     return rx.center(
         rx.vstack(
+            rx.cond(
+                State.job_status != "",
+                rx.text(State.job_status),
+            ),
             rx.foreach (
                 State.job_results,
                 lambda job: rx.text(job),